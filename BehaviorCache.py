@@ -0,0 +1,82 @@
+from collections import OrderedDict, defaultdict
+
+from pyzcasp import potassco
+from caspo import core, analyze
+
+class BehaviorCache(object):
+    """
+    Memo of the input-output behavior of each network analyzed so far.
+    
+    Networks are identified by a fingerprint of their mapping and each one maps to the id of its behavior.
+    Behaviors are equivalence classes over all clampings of the experimental setup, so the memo is valid for
+    any dataset with the same setup. Up to size fingerprints are kept, evicting the least recently used ones.
+    """
+    
+    def __init__(self, size=100000):
+        self.size = size
+        self.classes = OrderedDict()
+        self.nclasses = 0
+    
+    @staticmethod
+    def fingerprint(network):
+        """
+        Returns a hashable key of the network mapping, whose formulas may be any iterable of clauses
+        """
+        return frozenset((var, frozenset(formula)) for var, formula in network.mapping.iteritems())
+    
+    def get(self, fingerprint):
+        cid = self.classes.pop(fingerprint, None)
+        if cid is not None:
+            self.classes[fingerprint] = cid
+        
+        return cid
+    
+    def put(self, fingerprint, cid):
+        self.classes.pop(fingerprint, None)
+        self.classes[fingerprint] = cid
+        while len(self.classes) > self.size:
+            self.classes.popitem(last=False)
+    
+    def behaviors(self, networks, dataset):
+        """
+        Returns the same behaviors as analyze.behaviors, but only networks not seen before are compared by the
+        solver. Known networks are grouped into a single behavior per class, with the other networks of the
+        class in its networks attribute, so that each behavior keeps its weight (number of networks).
+        """
+        fingerprints = {}
+        unseen = []
+        known = defaultdict(list)
+        for network in networks:
+            fingerprints[network] = self.fingerprint(network)
+            cid = self.get(fingerprints[network])
+            if cid is None:
+                unseen.append(network)
+            else:
+                known[cid].append(network)
+        
+        candidates = core.BooleLogicNetworkSet(unseen, update_names=False)
+        for members in known.itervalues():
+            eb = analyze.BooleLogicBehavior(members[0].variables, members[0].mapping)
+            eb.networks = set(members[1:])
+            fingerprints[eb] = fingerprints[members[0]]
+            candidates.add(eb, update_names=False)
+        
+        behaviors = analyze.behaviors(candidates, dataset, potassco.IClingo)
+        
+        for eb in behaviors:
+            members = [eb] + list(eb.networks)
+            for member in members:
+                if member not in fingerprints:
+                    fingerprints[member] = self.fingerprint(member)
+            
+            cids = [self.classes[fingerprints[m]] for m in members if fingerprints[m] in self.classes]
+            if cids:
+                cid = cids[0]
+            else:
+                cid = self.nclasses
+                self.nclasses += 1
+            
+            for member in members:
+                self.put(fingerprints[member], cid)
+        
+        return behaviors
@@ -1,5 +1,10 @@
 import sqlite3 as lite
 
+import os
+import time
+import json
+import zlib
+import threading
 import numpy as np
 import random
 from collections import defaultdict
@@ -8,16 +13,144 @@ from pyzcasp import asp, potassco
 from caspo import core, learn, visualize
 from zope import component
 
-from Dataset import Dataset
+from Dataset import Dataset, ColumnarDataset
+from Simulator import Simulator
 
 class DB(object):
     """
     Database class to access sqlite database
+    
+    Each process and thread uses a single long-lived connection (see DB.connect).
+    In WAL journal mode readers don't block the writer, so parallel benchmarks can share the same file.
+    
+    Experiments in dataset-like tables are identified by the key column, a bitmask over stimuli and
+    inhibitors columns (see DB.encode_key), indexed together with idmodel. Setups with more than 63 stimuli
+    and inhibitors don't fit in an integer key, so the key is the text of the columns values instead.
+    The number of stimuli and inhibitors of each experiment are stored in n_stimuli and n_inhibitors columns.
+    
+    Networks learned in each iteration are stored as bitsets over the PKN clauses ids (see DB.insert_networks).
+    
+    Benchmarks can be split among workers (possibly on several hosts sharing a filesystem) through the
+    benchmark_queue table, see DB.claim_benchmark. Each worker writes its results to its own shard DB, which reads
+    the PKN and datasets from this one (see DB.shard), and DB.merge_shard copies them back.
     """
     
-    def __init__(self, name, setup):
+    data_tables = ['dataset', 'benchmark_data']
+    benchmark_tables = ['benchmark_iterations', 'benchmark_data', 'benchmark_mse', 'benchmark_behaviors', 'benchmark_timings', 
+                        'benchmark_solver', 'benchmark_networks', 'benchmark_budgets']
+    pragmas = [('synchronous', 'NORMAL'), ('cache_size', -65536), ('mmap_size', 268435456), ('temp_store', 'MEMORY')]
+    
+    def __init__(self, name, setup, timeout=300, journal_mode='WAL', cached_statements=256, columnar=False, source=None):
         self.name = name
         self.setup = setup
+        self.key_type = 'TEXT' if len(setup.stimuli) + len(setup.inhibitors) > 63 else 'INT'
+        self.dataset_class = ColumnarDataset if columnar else Dataset
+        self.timeout = timeout
+        self.journal_mode = journal_mode
+        self.cached_statements = cached_statements
+        self.source = source
+        self.__local = threading.local()
+        self.__clauses = None
+        
+    def connect(self):
+        """
+        Returns the connection of the current process and thread, opening it on first use.
+        The timeout makes concurrent writers wait for the lock instead of failing and
+        sqlite3 reuses prepared statements for queries with the same SQL text.
+        The source DB of a shard is attached so that tables missing in the shard are read from it.
+        """
+        if getattr(self.__local, 'pid', None) != os.getpid():
+            con = lite.connect(self.name, timeout=self.timeout, cached_statements=self.cached_statements)
+            con.row_factory = lite.Row
+            
+            con.execute("PRAGMA journal_mode=%s" % self.journal_mode)
+            for pragma, value in self.pragmas:
+                con.execute("PRAGMA %s=%s" % (pragma, value))
+            
+            if self.source:
+                con.execute("ATTACH DATABASE ? AS source", (self.source,))
+            
+            self.__local.con = con
+            self.__local.pid = os.getpid()
+            
+        return self.__local.con
+        
+    def close(self):
+        """
+        Closes the connection of the current process and thread. It must be called before forking.
+        """
+        if getattr(self.__local, 'pid', None) == os.getpid():
+            self.__local.con.close()
+            
+        self.__local.con = None
+        self.__local.pid = None
+        
+    def get_input_columns(self):
+        """
+        Returns the stimuli and inhibitors columns identifying an experiment in dataset-like tables
+        """
+        return self.setup.stimuli + map(lambda i: i+'i', self.setup.inhibitors)
+        
+    def get_data_columns(self):
+        """
+        Returns the fixed column order used to insert experiments into dataset-like tables
+        """
+        return self.get_input_columns() + self.setup.readouts + ['idmodel', 'key', 'n_stimuli', 'n_inhibitors']
+        
+    def get_inputs(self, clamping):
+        """
+        Returns the values for stimuli and inhibitors columns of a clamping
+        """
+        dc = dict(clamping)
+        return [1 if dc[s] == 1 else 0 for s in self.setup.stimuli] + [1 if i in dc else 0 for i in self.setup.inhibitors]
+        
+    def encode_key(self, inputs):
+        """
+        Returns the clamping key for the values of stimuli and inhibitors columns (bit i is set if the i-th column is 1)
+        or, for wide setups, the string of the values
+        """
+        if self.key_type == 'TEXT':
+            return "".join('1' if v == 1 else '0' for v in inputs)
+            
+        key = 0
+        for i, v in enumerate(inputs):
+            if v == 1:
+                key |= 1 << i
+                
+        return key
+        
+    def get_key(self, clamping):
+        return self.encode_key(self.get_inputs(clamping))
+        
+    def get_key_sql(self):
+        """
+        Returns the SQL expression computing the clamping key from stimuli and inhibitors columns
+        """
+        if self.key_type == 'TEXT':
+            return "||".join(self.get_input_columns())
+            
+        return "+".join("(%s<<%s)" % (c, i) for i, c in enumerate(self.get_input_columns()))
+        
+    def get_derived_columns(self):
+        """
+        Returns the columns computed from stimuli and inhibitors columns together with their SQL expressions
+        """
+        return [('key', self.get_key_sql()), 
+                ('n_stimuli', "+".join(self.setup.stimuli)), 
+                ('n_inhibitors', "+".join(map(lambda i: i+'i', self.setup.inhibitors)))]
+        
+    def get_select_columns(self, table):
+        return ",".join("%s.%s" % (table, c) for c in self.get_data_columns())
+        
+    def insert_rows(self, cur, table, rows):
+        """
+        Inserts rows (values following DB.get_data_columns order without the key and counts) using a single parameterized statement
+        """
+        cols = self.get_data_columns()
+        ns = len(self.setup.stimuli)
+        n = len(self.get_input_columns())
+        cur.executemany("INSERT INTO %s (%s) VALUES (%s)" % (table, ",".join(cols), ",".join("?" * len(cols))), 
+                        (row + [self.encode_key(row[:n]), sum(row[:ns]), sum(row[ns:n])] for row in rows))
         
     def get_data_header(self, it=False):
         header_in = self.setup.stimuli \
@@ -31,15 +164,15 @@ class DB(object):
         for c in header_out:
             cols += "%s REAL, " % c
         if not it:
-            return cols + "idmodel INT, FOREIGN KEY(idmodel) REFERENCES model(id)"
+            return cols + "idmodel INT, key %s, n_stimuli INT, n_inhibitors INT, FOREIGN KEY(idmodel) REFERENCES model(id)" % self.key_type
         else:
-            return cols + "idmodel INT, it INT, FOREIGN KEY(idmodel) REFERENCES model(id)"
+            return cols + "idmodel INT, key %s, n_stimuli INT, n_inhibitors INT, it INT, FOREIGN KEY(idmodel) REFERENCES model(id)" % self.key_type
 
     def create_db(self):
         """
         Create common DB tables.
         """
-        con = lite.connect(self.name)
+        con = self.connect()
         names = component.getUtility(core.ILogicalNames)
     
         with con:
@@ -49,13 +182,16 @@ class DB(object):
             
             cur.execute("DROP TABLE IF EXISTS dataset")
             cur.execute("CREATE TABLE dataset (%s)" % self.get_data_header())
-            cur.execute("CREATE INDEX main.dataset_idmodel ON dataset (idmodel ASC)")
+            cur.execute("CREATE INDEX main.dataset_key ON dataset (idmodel, key)")
+            cur.execute("CREATE INDEX main.dataset_counts ON dataset (idmodel, n_stimuli, n_inhibitors)")
         
             cur.execute("DROP TABLE IF EXISTS benchmark_iterations")
-            cur.execute("CREATE TABLE benchmark_iterations (idmodel INT, it INT, FOREIGN KEY(idmodel) REFERENCES model(id))")
+            cur.execute("CREATE TABLE benchmark_iterations (idmodel INT, it INT, done INT DEFAULT 0, FOREIGN KEY(idmodel) REFERENCES model(id))")
         
             cur.execute("DROP TABLE IF EXISTS benchmark_data")
             cur.execute("CREATE TABLE benchmark_data (%s)" % self.get_data_header(True))
+            cur.execute("CREATE INDEX main.benchmark_data_key ON benchmark_data (idmodel, key)")
+            cur.execute("CREATE INDEX main.benchmark_data_it ON benchmark_data (idmodel, it)")
         
             cur.execute("DROP TABLE IF EXISTS benchmark_mse")
             cur.execute("CREATE TABLE benchmark_mse (idmodel INT, it INT, training REAL, testing REAL, \
@@ -63,6 +199,192 @@ class DB(object):
                 
             cur.execute("DROP TABLE IF EXISTS benchmark_behaviors")
             cur.execute("CREATE TABLE benchmark_behaviors (idmodel INT, it INT, fit REAL, size INT, networks INT, behaviors INT, FOREIGN KEY(idmodel) REFERENCES model(id))")
+            
+            cur.execute("DROP TABLE IF EXISTS benchmark_timings")
+            cur.execute("CREATE TABLE benchmark_timings (idmodel INT, it INT, run INT, phase TEXT, calls INT, wall REAL, cpu REAL, solver REAL, \
+                rss INT, solver_rss INT, networks INT, behaviors INT, FOREIGN KEY(idmodel) REFERENCES model(id))")
+            
+            cur.execute("DROP TABLE IF EXISTS benchmark_solver")
+            cur.execute("CREATE TABLE benchmark_solver (idmodel INT, it INT, run INT, phase TEXT, calls INT, ground REAL, solve REAL, cpu REAL, \
+                choices INT, conflicts INT, models INT, threads INT, FOREIGN KEY(idmodel) REFERENCES model(id))")
+
+            cur.execute("DROP TABLE IF EXISTS benchmark_checkpoints")
+            cur.execute("CREATE TABLE benchmark_checkpoints (idmodel INT, it INT, phase TEXT, value BLOB, PRIMARY KEY (idmodel, it, phase))")
+
+            cur.execute("DROP TABLE IF EXISTS benchmark_networks")
+            cur.execute("CREATE TABLE benchmark_networks (idmodel INT, it INT, clauses INT, networks INT, value BLOB, PRIMARY KEY (idmodel, it))")
+
+            cur.execute("DROP TABLE IF EXISTS benchmark_budgets")
+            cur.execute("CREATE TABLE benchmark_budgets (idmodel INT, it INT, run INT, phase TEXT, budget TEXT, used REAL, allowed REAL, \
+                action TEXT, FOREIGN KEY(idmodel) REFERENCES model(id))")
+
+            cur.execute("DROP TABLE IF EXISTS benchmark_queue")
+            cur.execute("CREATE TABLE benchmark_queue (idmodel INT PRIMARY KEY, state TEXT, worker TEXT, heartbeat REAL, attempts INT DEFAULT 0)")
+
+    def upgrade_db(self):
+        """
+        Upgrade in place a DB created by a previous version, adding the missing columns
+        (clamping keys, stimuli and inhibitors counts and finished benchmarks), indexes and tables.
+        """
+        con = self.connect()
+        
+        with con:
+            cur = con.cursor()
+            cols = [row[1] for row in cur.execute("PRAGMA table_info(benchmark_iterations)")]
+            if 'done' not in cols:
+                cur.execute("ALTER TABLE benchmark_iterations ADD COLUMN done INT DEFAULT 0")
+                
+            for table in self.data_tables:
+                cols = [row[1] for row in cur.execute("PRAGMA table_info(%s)" % table)]
+                for col, sql in self.get_derived_columns():
+                    if col not in cols:
+                        cur.execute("ALTER TABLE %s ADD COLUMN %s %s" % (table, col, self.key_type if col == 'key' else 'INT'))
+                        cur.execute("UPDATE %s SET %s=%s" % (table, col, sql))
+                
+                cur.execute("CREATE INDEX IF NOT EXISTS main.%s_key ON %s (idmodel, key)" % (table, table))
+                
+            cur.execute("CREATE INDEX IF NOT EXISTS main.benchmark_data_it ON benchmark_data (idmodel, it)")
+            cur.execute("CREATE INDEX IF NOT EXISTS main.dataset_counts ON dataset (idmodel, n_stimuli, n_inhibitors)")
+            cur.execute("CREATE TABLE IF NOT EXISTS benchmark_timings (idmodel INT, it INT, run INT, phase TEXT, calls INT, wall REAL, cpu REAL, solver REAL, \
+                rss INT, solver_rss INT, networks INT, behaviors INT, FOREIGN KEY(idmodel) REFERENCES model(id))")
+            cur.execute("CREATE TABLE IF NOT EXISTS benchmark_solver (idmodel INT, it INT, run INT, phase TEXT, calls INT, ground REAL, solve REAL, cpu REAL, \
+                choices INT, conflicts INT, models INT, threads INT, FOREIGN KEY(idmodel) REFERENCES model(id))")
+            cur.execute("CREATE TABLE IF NOT EXISTS benchmark_checkpoints (idmodel INT, it INT, phase TEXT, value BLOB, PRIMARY KEY (idmodel, it, phase))")
+            cur.execute("CREATE TABLE IF NOT EXISTS benchmark_networks (idmodel INT, it INT, clauses INT, networks INT, value BLOB, PRIMARY KEY (idmodel, it))")
+            cur.execute("CREATE TABLE IF NOT EXISTS benchmark_budgets (idmodel INT, it INT, run INT, phase TEXT, budget TEXT, used REAL, allowed REAL, \
+                action TEXT, FOREIGN KEY(idmodel) REFERENCES model(id))")
+            cur.execute("CREATE TABLE IF NOT EXISTS benchmark_queue (idmodel INT PRIMARY KEY, state TEXT, worker TEXT, heartbeat REAL, attempts INT DEFAULT 0)")
+            
+    def shard(self, worker):
+        """
+        Returns the shard DB of the given worker, creating its tables if the file doesn't exist yet.
+        A worker restarted with the same name resumes its unfinished benchmarks from its shard.
+        """
+        db = type(self)('%s-%s' % (self.name, worker), self.setup, self.timeout, self.journal_mode, self.cached_statements, 
+                        self.dataset_class is ColumnarDataset, source=self.name)
+        
+        if not os.path.exists(db.name):
+            con = db.connect()
+            with con:
+                cur = con.cursor()
+                cur.execute("SELECT sql FROM source.sqlite_master WHERE tbl_name IN (%s) AND sql IS NOT NULL ORDER BY type DESC" 
+                            % ",".join("'%s'" % table for table in self.benchmark_tables + ['benchmark_checkpoints']))
+                
+                # tables and indexes are created as in this DB so that columns match when merging
+                for sql, in cur.fetchall():
+                    cur.execute(sql)
+                
+        return db
+        
+    def insert_queue(self, idmodels):
+        """
+        Queues the given benchmarks (those already in the queue are kept)
+        """
+        con = self.connect()
+        
+        with con:
+            cur = con.cursor()
+            cur.executemany("INSERT OR IGNORE INTO benchmark_queue (idmodel, state) VALUES (?, 'queued')", [(i,) for i in idmodels])
+            
+    def claim_benchmark(self, worker, lease, attempts=3):
+        """
+        Claims the first queued benchmark, or a running one whose worker didn't send a heartbeat in the last
+        lease seconds (e.g., because it crashed), and returns its id or None if there's none left.
+        Benchmarks claimed attempts times are not claimed again: those left running are marked as failed.
+        The single UPDATE statement makes the claim atomic among processes and hosts.
+        """
+        con = self.connect()
+        now = time.time()
+        params = {'worker': worker, 'now': now, 'expired': now - lease, 'attempts': attempts}
+        
+        with con:
+            cur = con.cursor()
+            cur.execute("UPDATE benchmark_queue SET state='failed' WHERE state='running' AND heartbeat<:expired AND attempts>=:attempts", params)
+            cur.execute("UPDATE benchmark_queue SET state='running', worker=:worker, heartbeat=:now, attempts=attempts+1 \
+                WHERE idmodel=(SELECT idmodel FROM benchmark_queue WHERE (state='queued' OR (state='running' AND heartbeat<:expired)) \
+                AND attempts<:attempts ORDER BY state DESC, idmodel LIMIT 1)", params)
+            
+            if not cur.rowcount:
+                return None
+            
+            cur.execute("SELECT idmodel FROM benchmark_queue WHERE state='running' AND worker=:worker AND heartbeat=:now", 
+                        {'worker': worker, 'now': now})
+            
+            return cur.fetchone()[0]
+            
+    def heartbeat(self, idmodel, worker):
+        """
+        Renews the lease of a benchmark claimed by the worker. Returns False if it was claimed by another worker.
+        """
+        return self.update_queue(idmodel, worker, "heartbeat=:now")
+        
+    def finish_benchmark(self, idmodel, worker):
+        """
+        Marks a benchmark claimed by the worker as done. Returns False if it was claimed by another worker.
+        """
+        return self.update_queue(idmodel, worker, "state='done', heartbeat=:now")
+        
+    def release_benchmark(self, idmodel, worker, attempts=3):
+        """
+        Queues again a benchmark claimed by the worker (e.g., if it failed), or marks it as failed
+        if it was already claimed attempts times
+        """
+        return self.update_queue(idmodel, worker, "state=CASE WHEN attempts<:attempts THEN 'queued' ELSE 'failed' END, \
+            worker=CASE WHEN attempts<:attempts THEN NULL ELSE worker END", attempts=attempts)
+        
+    def update_queue(self, idmodel, worker, values, **params):
+        con = self.connect()
+        params.update({'idmodel': idmodel, 'worker': worker, 'now': time.time()})
+        
+        with con:
+            cur = con.cursor()
+            cur.execute("UPDATE benchmark_queue SET %s WHERE idmodel=:idmodel AND worker=:worker AND state='running'" % values, params)
+            
+            return cur.rowcount > 0
+            
+    def get_queue(self):
+        """
+        Returns the number of benchmarks in each state, the benchmarks done by each worker and the failed
+        benchmarks as tuples (idmodel, last worker, attempts)
+        """
+        con = self.connect()
+        
+        with con:
+            cur = con.cursor()
+            cur.execute("SELECT state, COUNT(*) FROM benchmark_queue GROUP BY state")
+            states = dict(cur.fetchall())
+            
+            cur.execute("SELECT worker, idmodel FROM benchmark_queue WHERE state='done' ORDER BY worker, idmodel")
+            workers = defaultdict(list)
+            for worker, idmodel in cur.fetchall():
+                workers[worker].append(idmodel)
+                
+            cur.execute("SELECT idmodel, worker, attempts FROM benchmark_queue WHERE state='failed' ORDER BY idmodel")
+            failed = map(tuple, cur.fetchall())
+                
+        return states, workers, failed
+        
+    def merge_shard(self, worker, idmodels):
+        """
+        Copies the results of the given benchmarks from the shard DB of the worker, replacing any previous results
+        of those benchmarks. Columns are matched by name, so shards can be merged into DBs upgraded in place.
+        """
+        con = self.connect()
+        con.execute("ATTACH DATABASE ? AS shard", ('%s-%s' % (self.name, worker),))
+        try:
+            with con:
+                cur = con.cursor()
+                cur.execute("CREATE TEMP TABLE IF NOT EXISTS merged (idmodel INT PRIMARY KEY)")
+                cur.execute("DELETE FROM temp.merged")
+                cur.executemany("INSERT INTO temp.merged VALUES (?)", [(i,) for i in idmodels])
+                
+                for table in self.benchmark_tables:
+                    cols = ",".join(row[1] for row in cur.execute("PRAGMA shard.table_info(%s)" % table).fetchall())
+                    cur.execute("DELETE FROM main.%s WHERE idmodel IN (SELECT idmodel FROM temp.merged)" % table)
+                    cur.execute("INSERT INTO main.%s (%s) SELECT %s FROM shard.%s WHERE idmodel IN (SELECT idmodel FROM temp.merged)" 
+                                % (table, cols, cols, table))
+        finally:
+            con.execute("DETACH DATABASE shard")
 
     def load_pkn(self, pkn, length):
         pkn = component.getMultiAdapter((pkn, self.setup), core.IGraph)
@@ -70,23 +392,35 @@ class DB(object):
         names = component.getUtility(core.ILogicalNames)
         names.load(pkn, length)
         
-        con = lite.connect(self.name)
+        self.__clauses = None
+        con = self.connect()
         with con:
             cur = con.cursor()
             for var in names.variables:
                 for i, clause in names.iterclauses(var):
-                    cur.execute("""INSERT INTO pkn (hyper) VALUES ("%s=%s")""" % (clause, var))
+                    cur.execute("INSERT INTO pkn (hyper) VALUES (?)", ("%s=%s" % (clause, var),))
+
+    def get_pkn(self):
+        """
+        Returns the clauses of the PKN as loaded by DB.load_pkn
+        """
+        con = self.connect()
+        
+        with con:
+            cur = con.cursor()
+            cur.execute("SELECT hyper FROM pkn ORDER BY id")
+            
+            return [row[0] for row in cur.fetchall()]
 
     def get_all_dataset(self, idmodel):
-        con = lite.connect(self.name)
+        con = self.connect()
 
         with con:
-            con.row_factory = lite.Row
             cur = con.cursor()
-            cur.execute("SELECT * FROM dataset where idmodel=:idmodel", {'idmodel': idmodel})
+            cur.execute("SELECT * FROM dataset where idmodel=:idmodel ORDER BY rowid", {'idmodel': idmodel})
                     
             rows = cur.fetchall()
-            dataset = Dataset.from_db_rows(rows, self.setup)
+            dataset = self.dataset_class.from_db_rows(rows, self.setup)
             
         return dataset   
 
@@ -94,73 +428,67 @@ class DB(object):
         """
         Initialize benchmarking
         """
-        con = lite.connect(self.name)
+        con = self.connect()
                 
         with con:
             cur = con.cursor()
-            cur.execute("INSERT INTO benchmark_iterations (idmodel, it) VALUES (%s,0)" % idmodel)
+            cur.execute("INSERT INTO benchmark_iterations (idmodel, it) VALUES (:idmodel,0)", {'idmodel': idmodel})
             
-    def get_benchmarking_data(self, idmodel, it=-1):
+    def get_benchmarking_rows(self, idmodel, it=-1):
         """
-        Returns a Dataset instance with the data used for learning up to iteration it
+        Returns the rows of the data used for learning up to iteration it
         """
-        con = lite.connect(self.name)
-        
-        cues = []
-        obs = []
-        nobs = defaultdict(int)
+        con = self.connect()
         
         with con:
-            con.row_factory = lite.Row
             cur = con.cursor()
             if it < 0:
-                cur.execute("SELECT * FROM benchmark_data WHERE idmodel=:idmodel", {'idmodel': idmodel})
+                cur.execute("SELECT * FROM benchmark_data WHERE idmodel=:idmodel ORDER BY rowid", {'idmodel': idmodel})
             else:
-                cur.execute("SELECT * FROM benchmark_data WHERE idmodel=:idmodel AND it<=:it", {'idmodel': idmodel, 'it': it})
+                cur.execute("SELECT * FROM benchmark_data WHERE idmodel=:idmodel AND it<=:it ORDER BY rowid", {'idmodel': idmodel, 'it': it})
         
             rows = cur.fetchall()
-            dataset = Dataset.from_db_rows(rows, self.setup)
     
-        return dataset
+        return rows
+        
+    def get_benchmarking_data(self, idmodel, it=-1):
+        """
+        Returns a Dataset instance with the data used for learning up to iteration it
+        """
+        return self.dataset_class.from_db_rows(self.get_benchmarking_rows(idmodel, it), self.setup)
 
     def insert_benchmarking_data(self, idmodel, clampings, it):
         """
         Move experiments (clampings + observations) from dataset table to benchmark_data table
         """
         
-        con = lite.connect(self.name)
+        con = self.connect()
     
         with con:
             cur = con.cursor()
-            for clamping in clampings:
-                where, inputs = self.get_where(idmodel, clamping)
-                cur.execute("INSERT INTO benchmark_data SELECT *, %s as it FROM dataset \
-                    WHERE %s" % (it, where), inputs)
+            self.load_candidates(cur, [clampings])
+            cur.execute("INSERT INTO benchmark_data (%s,it) SELECT %s, :it as it FROM candidates \
+                JOIN dataset ON dataset.idmodel=:idmodel AND dataset.key=candidates.key ORDER BY candidates.pos, dataset.rowid" 
+                % (",".join(self.get_data_columns()), self.get_select_columns('dataset')), {'idmodel': idmodel, 'it': it})
 
-    def get_where(self, idmodel, clamping):
-        inputs = {'idmodel': idmodel}
-        
-        dc = dict(clamping)
-        for s in self.setup.stimuli:
-            if dc[s] == 1:
-                inputs[s] = 1
-            else:
-                inputs[s] = 0
-        
-        for i in self.setup.inhibitors:
-            if i in dc:
-                inputs[i+'i'] = 1
-            else:
-                inputs[i+'i'] = 0
+    def load_candidates(self, cur, designs):
+        """
+        Fill the temporary candidates table with the clampings of each design so they can be
+        resolved against dataset-like tables with a single join
+        """
+        cur.execute("CREATE TEMP TABLE IF NOT EXISTS candidates (design INT, pos INT, key %s)" % self.key_type)
+        cur.execute("DELETE FROM candidates")
         
-        header = self.setup.stimuli \
-               + map(lambda i: i+'i', self.setup.inhibitors)
+        rows = []
+        for d, clampings in enumerate(designs):
+            for p, clamping in enumerate(clampings):
+                rows.append((d, p, self.get_key(clamping)))
+                
+        cur.executemany("INSERT INTO candidates VALUES (?,?,?)", rows)
 
-        where = ""
-        for h in header:
-            where += "%s=:%s AND " % (h,h)
-        
-        where += "idmodel=:idmodel"
+    def get_where(self, idmodel, clamping):
+        inputs = {'idmodel': idmodel, 'key': self.get_key(clamping)}
+        where = "key=:key AND idmodel=:idmodel"
     
         return where, inputs
         
@@ -168,67 +496,261 @@ class DB(object):
         """
         Filter experiments already in benchmark_data table
         """
-        con = lite.connect(self.name)
+        return self.check_designs(idmodel, [clampings])[0]
+        
+    def check_designs(self, idmodel, designs):
+        """
+        Filter experiments already in benchmark_data table for every design (list of clampings) at once.
+        Returns the list of new clampings for each design.
+        """
+        con = self.connect()
         
-        new_clampings = []
+        designs = map(list, designs)
+        new_clampings = [[] for _ in designs]
         with con:
             cur = con.cursor()
-            for c in clampings:
-                where, inputs = self.get_where(idmodel, c)
-                cur.execute("SELECT * FROM benchmark_data WHERE %s" % where, inputs)
-                row = cur.fetchone()
-                if not row:
-                    new_clampings.append(c)
+            self.load_candidates(cur, designs)
+            cur.execute("SELECT c.design, c.pos FROM candidates c WHERE NOT EXISTS \
+                (SELECT 1 FROM benchmark_data b WHERE b.idmodel=:idmodel AND b.key=c.key) ORDER BY c.design, c.pos", {'idmodel': idmodel})
+            
+            for d, p in cur.fetchall():
+                new_clampings[d].append(designs[d][p])
     
         return new_clampings
         
     def insert_mse(self, idmodel, it, learning, testing):
-        con = lite.connect(self.name)
+        con = self.connect()
         
         with con:
             cur = con.cursor()
             cur.execute("INSERT INTO benchmark_mse (idmodel,it,training,testing) \
-                VALUES (%s,%s,%s,%s)" % (idmodel,it,learning,testing))
+                VALUES (?,?,?,?)", (idmodel,it,learning,testing))
                 
-    def insert_last_it(self, idmodel, it):
-        con = lite.connect(self.name)
+    def insert_last_it(self, idmodel, it, done=False):
+        """
+        Stores the iteration to resume from and removes the checkpoints of previous iterations (or all of them if done)
+        """
+        con = self.connect()
+
+        with con:
+            cur = con.cursor()
+            cur.execute("UPDATE benchmark_iterations SET it=:it, done=:done WHERE idmodel=:idmodel", 
+                {'idmodel':idmodel, 'it':it, 'done': int(done)})
+            cur.execute("DELETE FROM benchmark_checkpoints WHERE idmodel=:idmodel AND (it<:it OR :done)", 
+                {'idmodel':idmodel, 'it':it, 'done': int(done)})
+            
+    def insert_checkpoint(self, idmodel, it, phase, value):
+        """
+        Stores the result of a phase of iteration it as compressed JSON
+        """
+        con = self.connect()
+
+        with con:
+            cur = con.cursor()
+            cur.execute("INSERT OR REPLACE INTO benchmark_checkpoints (idmodel, it, phase, value) VALUES (?,?,?,?)", 
+                (idmodel, it, phase, lite.Binary(zlib.compress(json.dumps(value)))))
+            
+    def get_checkpoint(self, idmodel, it, phase):
+        """
+        Returns the result of a phase of iteration it stored by DB.insert_checkpoint or None
+        """
+        con = self.connect()
 
         with con:
             cur = con.cursor()
-            cur.execute("UPDATE benchmark_iterations SET it=:it WHERE idmodel=:idmodel", {'idmodel':idmodel, 'it':it})
+            cur.execute("SELECT value FROM benchmark_checkpoints WHERE idmodel=:idmodel AND it=:it AND phase=:phase", 
+                {'idmodel':idmodel, 'it':it, 'phase':phase})
+            row = cur.fetchone()
+            
+        return json.loads(zlib.decompress(row[0])) if row else None
             
     def insert_behaviors(self, idmodel, it, fit, size, networks, behaviors):
-        con = lite.connect(self.name)
+        con = self.connect()
 
         with con:
             cur = con.cursor()
             cur.execute("INSERT INTO benchmark_behaviors (idmodel, it, fit, size, networks, behaviors) \
-                VALUES (%s,%s,%s,%s,%s,%s)" % (idmodel, it, fit, size, networks, behaviors))
+                VALUES (?,?,?,?,?,?)", (idmodel, it, fit, size, networks, behaviors))
                 
-    def get_random_dataset(self, idmodel, nexp, max_stimuli=0, max_inhibitors=0):
-        rows = self.get_population_rows(idmodel, max_stimuli, max_inhibitors)
-        exps = random.sample(rows, nexp)
-        dataset = Dataset.from_db_rows(exps, self.setup)
+    def get_clauses(self):
+        """
+        Returns the pairs (clause, variable) of the PKN ordered by id. Bit i of network bitsets is set if the network
+        has the i-th clause (see DB.encode_networks).
+        """
+        if self.__clauses is None:
+            self.__clauses = []
+            for hyper in self.get_pkn():
+                clause, var = hyper.split("=")
+                self.__clauses.append((core.Clause.from_str(clause), var))
+            
+        return self.__clauses
+        
+    def encode_networks(self, networks):
+        """
+        Returns a networks x bytes matrix with the bitset over the PKN clauses of each network
+        """
+        index = dict(("%s=%s" % (clause, var), i) for i, (clause, var) in enumerate(self.get_clauses()))
+        
+        bits = np.zeros((len(networks), len(index)), dtype=bool)
+        for row, network in enumerate(networks):
+            for var, formula in network.mapping.iteritems():
+                for clause in formula:
+                    bits[row, index["%s=%s" % (clause, var)]] = True
+                    
+        return np.packbits(bits, axis=1)
+        
+    def decode_networks(self, packed):
+        """
+        Returns the list of networks given by the rows of a matrix of bitsets (see DB.encode_networks)
+        """
+        clauses = self.get_clauses()
+        bits = np.unpackbits(packed, axis=1)[:, :len(clauses)].astype(bool)
+        variables = sorted(set(var for clause, var in clauses))
+        
+        networks = []
+        for row in bits:
+            mapping = defaultdict(list)
+            for i in np.flatnonzero(row):
+                clause, var = clauses[i]
+                mapping[var].append(clause)
+                
+            networks.append(core.BooleLogicNetwork(variables, mapping))
+            
+        return networks
+        
+    def insert_networks(self, idmodel, it, networks):
+        """
+        Stores the networks learned in iteration it (or those in a NetworkStore) as a compressed matrix of bitsets
+        over the PKN clauses
+        """
+        chunks = networks.chunks(10000) if hasattr(networks, 'chunks') else [(0, self.encode_networks(list(networks)))]
+        
+        compressor = zlib.compressobj()
+        value = "".join(compressor.compress(packed.tobytes()) for start, packed in chunks) + compressor.flush()
+        
+        con = self.connect()
+        with con:
+            cur = con.cursor()
+            cur.execute("INSERT OR REPLACE INTO benchmark_networks (idmodel, it, clauses, networks, value) VALUES (?,?,?,?,?)", 
+                (idmodel, it, len(self.get_clauses()), len(networks), lite.Binary(value)))
+                
+    def get_network_bits(self, idmodel, it):
+        """
+        Returns the matrix of bitsets of the networks learned in iteration it (see DB.encode_networks) or None.
+        Rows can be compared by their raw bytes (ndarray.tostring), e.g., to find networks learned in several iterations.
+        """
+        con = self.connect()
+        with con:
+            cur = con.cursor()
+            cur.execute("SELECT clauses, networks, value FROM benchmark_networks WHERE idmodel=:idmodel AND it=:it", {'idmodel':idmodel, 'it':it})
+            row = cur.fetchone()
+            
+        if row is None:
+            return None
+            
+        return np.frombuffer(zlib.decompress(row[2]), dtype=np.uint8).reshape(row[1], (row[0] + 7) // 8)
+        
+    def get_networks(self, idmodel, it):
+        """
+        Returns the networks learned in iteration it or None
+        """
+        packed = self.get_network_bits(idmodel, it)
+        return core.BooleLogicNetworkSet(self.decode_networks(packed), update_names=False) if packed is not None else None
+        
+    def insert_timings(self, rows):
+        """
+        Inserts rows (idmodel, it, run, phase, calls, wall, cpu, solver, rss, solver_rss, networks, behaviors)
+        """
+        con = self.connect()
+
+        with con:
+            cur = con.cursor()
+            cur.executemany("INSERT INTO benchmark_timings VALUES (?,?,?,?,?,?,?,?,?,?,?,?)", rows)
+                
+    def insert_solver_stats(self, rows):
+        """
+        Inserts rows (idmodel, it, run, phase, calls, ground, solve, cpu, choices, conflicts, models, threads)
+        """
+        con = self.connect()
+
+        with con:
+            cur = con.cursor()
+            cur.executemany("INSERT INTO benchmark_solver VALUES (?,?,?,?,?,?,?,?,?,?,?,?)", rows)
+                
+    def insert_budget(self, idmodel, it, run, exceeded, action):
+        """
+        Stores the budget exceeded (see Watchdog) in iteration it (or random run) and the action taken
+        """
+        con = self.connect()
+
+        with con:
+            cur = con.cursor()
+            cur.execute("INSERT INTO benchmark_budgets VALUES (?,?,?,?,?,?,?,?)", 
+                        (idmodel, it, run, exceeded.phase, exceeded.budget, exceeded.used, exceeded.allowed, action))
+                
+    def get_random_dataset(self, idmodel, nexp, max_stimuli=0, max_inhibitors=0, rng=random, rows=None):
+        """
+        Returns a Dataset instance with nexp experiments sampled from the population rows
+        (as given by get_population_rows, which is called if rows is None)
+        """
+        if rows is None:
+            rows = self.get_population_rows(idmodel, max_stimuli, max_inhibitors)
+            
+        exps = rng.sample(rows, nexp)
+        dataset = self.dataset_class.from_db_rows(exps, self.setup)
             
         return dataset
         
     def get_last_it(self, idmodel):
-        con = lite.connect(self.name)
+        """
+        Returns the iteration to resume from or None if the benchmark was never initialized
+        """
+        con = self.connect()
 
-        it = 0
+        it = None
         with con:
             cur = con.cursor()
             cur.execute("SELECT it from benchmark_iterations WHERE idmodel=:idmodel", {'idmodel':idmodel})
-            it = cur.fetchone()[0]
+            row = cur.fetchone()
+            if row:
+                it = row[0]
 
         return it
+        
+    def is_done(self, idmodel):
+        con = self.connect()
+
+        with con:
+            cur = con.cursor()
+            cur.execute("SELECT done from benchmark_iterations WHERE idmodel=:idmodel", {'idmodel':idmodel})
+            row = cur.fetchone()
+            
+        return bool(row and row[0])
+        
+    def reset_iteration(self, idmodel, it):
+        """
+        Remove results from an interrupted iteration it so it can be run again, keeping the checkpoints of its
+        completed phases
+        """
+        con = self.connect()
+
+        with con:
+            cur = con.cursor()
+            cur.execute("DELETE FROM benchmark_data WHERE idmodel=:idmodel AND it>:it", {'idmodel':idmodel, 'it':it})
+            cur.execute("DELETE FROM benchmark_mse WHERE idmodel=:idmodel AND it>=:it", {'idmodel':idmodel, 'it':it})
+            cur.execute("DELETE FROM benchmark_behaviors WHERE idmodel=:idmodel AND it>=:it", {'idmodel':idmodel, 'it':it})
+            cur.execute("DELETE FROM benchmark_timings WHERE idmodel=:idmodel AND it>=:it AND run IS NULL", {'idmodel':idmodel, 'it':it})
+            cur.execute("DELETE FROM benchmark_solver WHERE idmodel=:idmodel AND it>=:it AND run IS NULL", {'idmodel':idmodel, 'it':it})
+            cur.execute("DELETE FROM benchmark_checkpoints WHERE idmodel=:idmodel AND it>:it", {'idmodel':idmodel, 'it':it})
+            cur.execute("DELETE FROM benchmark_networks WHERE idmodel=:idmodel AND it>=:it", {'idmodel':idmodel, 'it':it})
+            cur.execute("DELETE FROM benchmark_budgets WHERE idmodel=:idmodel AND it>=:it AND run IS NULL", {'idmodel':idmodel, 'it':it})
 
 class iDB(DB):
     
     def create_db(self):
         super(iDB, self).create_db()
 
-        con = lite.connect(self.name)
+        con = self.connect()
         with con:
             cur = con.cursor()
             
@@ -236,68 +758,52 @@ class iDB(DB):
             cur.execute("CREATE TABLE model (idmodel INT, idclause INT, FOREIGN KEY(idclause) REFERENCES pkn(id))")
             
             
-    def generate_benchmarks(self, n, size, nand, maxin):
+    def generate_benchmarks(self, n, size, nand, maxin, seed=None):
         """
-        Generate n insilico benchmarks (gold standard and data with noise)
+        Generate n insilico benchmarks (gold standard and data with noise).
+        If a seed is given, the random generators used for gold standards and noise are seeded with it.
         """
+        if seed is not None:
+            random.seed(seed)
+            np.random.seed(seed)
+            
         names = component.getUtility(core.ILogicalNames)
         clingo = component.getUtility(potassco.IClingo)
     
         instance = asp.ITermSet(names).union(asp.ITermSet(self.setup))
         learner = component.getMultiAdapter((instance, clingo), learn.ILearner)
         
-        con = lite.connect(self.name)
-    
-        header = self.setup.stimuli + map(lambda i: i+'i', self.setup.inhibitors) + self.setup.readouts
+        con = self.connect()
+        
+        clampings = list(self.setup.iterclampings())
+        inputs = map(self.get_inputs, clampings)
         
         for i in range(n):
             golden = learner.random(1, size, nand, maxin).pop()
             writer = component.getMultiAdapter((visualize.IMultiDiGraph(golden), self.setup), visualize.IDotWriter)
             writer.write('golden-%s.dot' % i, '.')
 
+            predictions = Simulator(golden, self.setup.readouts).predictions(clampings).T.astype(float)
+            
+            noise = np.random.beta(1, 5, size=predictions.shape)
+            values = np.where(predictions == 1, predictions - noise, predictions + noise).tolist()
+            
             with con:
-                con.row_factory = lite.Row
                 cur = con.cursor()
-                for var, formula in golden.mapping.iteritems():
-                    for clause in formula:
-                        cur.execute("SELECT * FROM pkn WHERE hyper=:k", {'k': "%s=%s" % (clause, var)})
-                        row = cur.fetchone()
-                        cur.execute("INSERT INTO model (idmodel, idclause) VALUES (%s,%s)" % (i, row['id']))
-                    
-                for clamping in self.setup.iterclampings():
-                    dc = dict(clamping)
-                    row = dict.fromkeys(header, 0)
-                    row['idmodel'] = i
+                hypers = ["%s=%s" % (clause, var) for var, formula in golden.mapping.iteritems() for clause in formula]
+                cur.executemany("INSERT INTO model (idmodel, idclause) SELECT ?, id FROM pkn WHERE hyper=?", 
+                                [(i, hyper) for hyper in hypers])
                 
-                    for inh in self.setup.inhibitors:
-                        if inh in dc:
-                            row[inh + 'i'] = 1
-                        
-                    for sti in self.setup.stimuli:
-                        row[sti] = 1 if dc[sti] == 1 else 0
-                    
-
-                    for readout in self.setup.readouts:
-                        row[readout] = golden.prediction(readout, clamping)
-                        noise = np.random.beta(1,5)
-                        if row[readout] == 1:
-                            row[readout] -= noise
-                        else:
-                            row[readout] += noise
-                    
-                    cols = str(tuple(row.keys()))
-                    vals = str(tuple(row.values()))
-                    cur.execute("INSERT INTO dataset %s VALUES %s" % (cols, vals))
+                self.insert_rows(cur, 'dataset', (inp + val + [i] for inp, val in zip(inputs, values)))
 
     def get_model(self, idmodel):
         """
         Returns gold standard with id idmodel
         """
-        con = lite.connect(self.name)
+        con = self.connect()
 
         mapping = defaultdict(list)
         with con:
-            con.row_factory = lite.Row
             cur = con.cursor()
             cur.execute("SELECT hyper FROM pkn JOIN model ON pkn.id=model.idclause WHERE idmodel=:idmodel", {'idmodel':idmodel})
             rows = cur.fetchall()
@@ -314,53 +820,36 @@ class iDB(DB):
         """
 
         super(iDB, self).init(idmodel)
-        con = lite.connect(self.name)
+        con = self.connect()
                 
         with con:
             cur = con.cursor()
-            sw = self.setup.stimuli[0]
-            for s in self.setup.stimuli[1:]:
-                sw += "+" + s
-        
-            iw = self.setup.inhibitors[0]+'i'
-            for i in self.setup.inhibitors[1:]:
-                iw += "+" + i+'i'
-                    
-            cur.execute("INSERT INTO benchmark_data SELECT *, 0 as it  FROM dataset WHERE \
-                    idmodel=:idmodel AND %s <= 1 AND %s <= 1" % (sw, iw), {'idmodel': idmodel})
+            cur.execute("INSERT INTO benchmark_data (%s,it) SELECT %s, 0 as it FROM dataset WHERE \
+                    idmodel=:idmodel AND n_stimuli <= 1 AND n_inhibitors <= 1 ORDER BY rowid" % (",".join(self.get_data_columns()), self.get_select_columns('dataset')), {'idmodel': idmodel})
                     
     def get_population_rows(self, idmodel, max_stimuli=0, max_inhibitors=0):
-        con = lite.connect(self.name)
+        con = self.connect()
 
         with con:    
-            sw = self.setup.stimuli[0]
-            for s in self.setup.stimuli[1:]:
-                sw += "+" + s
-        
-            iw = self.setup.inhibitors[0]+'i'
-            for i in self.setup.inhibitors[1:]:
-                iw += "+" + i+'i'
-        
-            con.row_factory = lite.Row
             cur = con.cursor()
             if max_stimuli > 0 and max_inhibitors > 0:
                 cur.execute("SELECT * FROM dataset where idmodel=:idmodel AND \
-                    (({sum_inh} <= :mi AND {sum_sti} BETWEEN 2 AND :ms) OR ({sum_sti} <= :ms AND {sum_inh} BETWEEN 2 AND :mi))".format(sum_sti=sw, sum_inh=iw), 
+                    ((n_inhibitors <= :mi AND n_stimuli BETWEEN 2 AND :ms) OR (n_stimuli <= :ms AND n_inhibitors BETWEEN 2 AND :mi)) ORDER BY rowid", 
                     {'idmodel': idmodel, 'ms': max_stimuli, 'mi': max_inhibitors})
                     
             elif max_stimuli > 0 or max_inhibitors > 0:
                 if max_stimuli > 0:
                     cur.execute("SELECT * FROM dataset where idmodel=:idmodel AND \
-                                (%s BETWEEN 2 AND :ms OR %s >= 2)" % (sw, iw), 
+                                (n_stimuli BETWEEN 2 AND :ms OR n_inhibitors >= 2) ORDER BY rowid", 
                                 {'idmodel': idmodel, 'ms': max_stimuli})
                 else:
                     cur.execute("SELECT * FROM dataset where idmodel=:idmodel AND \
-                                (%s >= 2 OR %s BETWEEN 2 AND :mi)" % (sw, iw), 
+                                (n_stimuli >= 2 OR n_inhibitors BETWEEN 2 AND :mi) ORDER BY rowid", 
                                 {'idmodel': idmodel, 'mi': max_inhibitors})
                                 
             else:
                 cur.execute("SELECT * FROM dataset where idmodel=:idmodel AND \
-                            (%s > 1 OR %s > 1)" % (sw, iw), {'idmodel': idmodel})
+                            (n_stimuli > 1 OR n_inhibitors > 1) ORDER BY rowid", {'idmodel': idmodel})
                         
             
             rows = cur.fetchall()
@@ -369,15 +858,18 @@ class iDB(DB):
 
 class rDB(DB):
     
+    data_tables = DB.data_tables + ['screening']
+    
     def create_db(self):
         super(rDB, self).create_db()
 
         cols_data = self.get_data_header()
-        con = lite.connect(self.name)
+        con = self.connect()
         with con:
             cur = con.cursor()
             cur.execute("DROP TABLE IF EXISTS screening")
             cur.execute("CREATE TABLE screening (%s)" % cols_data)
+            cur.execute("CREATE INDEX main.screening_key ON screening (idmodel, key)")
 
     def init(self, idmodel=0):
         """
@@ -385,100 +877,54 @@ class rDB(DB):
         """
 
         super(rDB, self).init(idmodel)
-        con = lite.connect(self.name)
+        con = self.connect()
                 
         with con:
             cur = con.cursor()
-            cur.execute("INSERT INTO benchmark_data SELECT *, 0 as it  FROM screening WHERE \
-                    idmodel=:idmodel", {'idmodel': idmodel})
+            cur.execute("INSERT INTO benchmark_data (%s,it) SELECT %s, 0 as it FROM screening WHERE \
+                    idmodel=:idmodel ORDER BY rowid" % (",".join(self.get_data_columns()), self.get_select_columns('screening')), {'idmodel': idmodel})
 
     def insert_data(self, idmodel, screening, stime, followup, ftime):
         """
         Insert screening dataset into screening table and followup dataset into dataset table
         """
-        con = lite.connect(self.name)
+        con = self.connect()
 
-        header = self.setup.stimuli + map(lambda i: i+'i', self.setup.inhibitors) + self.setup.readouts
-        
+        def row(clamping, obs):
+            return self.get_inputs(clamping) + [obs.get(r, "NaN") for r in self.setup.readouts] + [idmodel]
+            
         with con:
             cur = con.cursor()
-                
-            for i, clamping, obs in followup.at(ftime):
-                dc = dict(clamping)
-                row = dict.fromkeys(header, 0)
-                row['idmodel'] = idmodel
-            
-                for inh in self.setup.inhibitors:
-                    if inh in dc:
-                        row[inh + 'i'] = 1
-                    
-                for sti in self.setup.stimuli:
-                    row[sti] = 1 if dc[sti] == 1 else 0
-                
-                for readout in self.setup.readouts:
-                    if readout in obs.keys():
-                        row[readout] = obs[readout]
-                    else:
-                        row[readout] = "NaN"
-                
-                cols = str(tuple(row.keys()))
-                vals = str(tuple(row.values()))
-                cur.execute("INSERT INTO dataset %s VALUES %s" % (cols, vals))
-                
+            self.insert_rows(cur, 'dataset', (row(clamping, obs) for i, clamping, obs in followup.at(ftime)))
+            
+            rows = []
             for i, clamping, obs in screening.at(stime):
-                dc = dict(clamping)
-                
-                ex = [k for k in dc if k not in self.setup.stimuli and dc[k] == 1]
+                ex = [k for k, v in clamping if k not in self.setup.stimuli and v == 1]
                 if not ex:
-                    row = dict.fromkeys(header, 0)
-                    row['idmodel'] = idmodel
-            
-                    for inh in self.setup.inhibitors:
-                        if inh in dc:
-                            row[inh + 'i'] = 1
+                    rows.append(row(clamping, obs))
                     
-                    for sti in self.setup.stimuli:
-                        row[sti] = 1 if dc[sti] == 1 else 0
-                
-                    for readout in self.setup.readouts:
-                        if readout in obs.keys():
-                            row[readout] = obs[readout]
-                        else:
-                            row[readout] = "NaN"
-                
-                    cols = str(tuple(row.keys()))
-                    vals = str(tuple(row.values()))
-                    cur.execute("INSERT INTO screening %s VALUES %s" % (cols, vals))
+            self.insert_rows(cur, 'screening', rows)
                     
     def get_population_rows(self, idmodel, max_stimuli=0, max_inhibitors=0):
-        con = lite.connect(self.name)
+        con = self.connect()
 
         with con:    
-            sw = self.setup.stimuli[0]
-            for s in self.setup.stimuli[1:]:
-                sw += "+" + s
-        
-            iw = self.setup.inhibitors[0]+'i'
-            for i in self.setup.inhibitors[1:]:
-                iw += "+" + i+'i'
-        
-            con.row_factory = lite.Row
             cur = con.cursor()
             if max_stimuli > 0 and max_inhibitors > 0:
                 cur.execute("SELECT * FROM dataset where idmodel=:idmodel AND \
-                    ({sum_inh} <= :mi OR {sum_sti} <= :ms)".format(sum_sti=sw, sum_inh=iw), 
+                    (n_inhibitors <= :mi OR n_stimuli <= :ms) ORDER BY rowid", 
                     {'idmodel': idmodel, 'ms': max_stimuli, 'mi': max_inhibitors})
                     
             elif max_stimuli > 0 or max_inhibitors > 0:
                 if max_stimuli > 0:
-                    cur.execute("SELECT * FROM dataset where idmodel=:idmodel AND %s <= :ms" % (sw, iw), 
+                    cur.execute("SELECT * FROM dataset where idmodel=:idmodel AND n_stimuli <= :ms ORDER BY rowid", 
                                 {'idmodel': idmodel, 'ms': max_stimuli})
                 else:
-                    cur.execute("SELECT * FROM dataset where idmodel=:idmodel AND %s <= :mi" % (sw, iw), 
+                    cur.execute("SELECT * FROM dataset where idmodel=:idmodel AND n_inhibitors <= :mi ORDER BY rowid", 
                                 {'idmodel': idmodel, 'mi': max_inhibitors})
                                 
             else:
-                cur.execute("SELECT * FROM dataset where idmodel=:idmodel", {'idmodel': idmodel})
+                cur.execute("SELECT * FROM dataset where idmodel=:idmodel ORDER BY rowid", {'idmodel': idmodel})
             
             rows = cur.fetchall()
             
@@ -1,5 +1,6 @@
 import math
 import random
+import numpy as np
 from collections import defaultdict
 
 from caspo import core
@@ -9,22 +10,30 @@ class Dataset(object):
     """
     Dataset class as required by caspo.
     
-    Use Dataset.from_db_rows to create a Dataset instance from a sqlite query
+    Use Dataset.from_db_rows to create a Dataset instance from a sqlite query.
+    The index attribute maps each clamping to the position of one of its experiments.
+    Sampling uses the random generator in the rng attribute (see Dataset.seed).
     """
     interface.implements(core.IDataset, core.IClampingList)
     
-    def __init__(self, setup, cues, obs, nobs, times):
+    def __init__(self, setup, cues, obs, nobs, times, seed=None):
         self.setup = setup
         self.cues = cues
         self.obs = obs
         self.nobs = nobs
         self.times = times
         self.nexps = len(self.cues)
+        self.rng = random.Random(seed)
+        
+        self.index = {}
+        for i, clamping in enumerate(self.cues):
+            self.index.setdefault(clamping, i)
         
     @classmethod
     def from_db_rows(cls, rows, setup):
         cues = []
         obs = []
+        index = {}
         nobs = defaultdict(int)
         times = frozenset([1])
         
@@ -47,10 +56,10 @@ class Dataset(object):
                     o[1][r] = float(row[r])
                     nobs[1] += 1
         
-            if clamping in cues:
-                index = cues.index(clamping)
-                obs[index].update(o)
+            if clamping in index:
+                obs[index[clamping]].update(o)
             else:
+                index[clamping] = len(cues)
                 cues.append(clamping)
                 obs.append(o)
         
@@ -69,6 +78,7 @@ class Dataset(object):
 
     def add(self, exps):
         for cues, obs in exps:
+            self.index.setdefault(cues, len(self.cues))
             self.cues.append(cues)
             self.obs.append(obs)
             
@@ -76,16 +86,214 @@ class Dataset(object):
             for t in self.times:
                 self.nobs[t] += len(obs[t])
 
+    def seed(self, seed=None):
+        self.rng.seed(seed)
+    
     def pop_sample(self, n):
+        """
+        Removes n experiments at random. Each removal swaps the chosen experiment with the last one,
+        so it takes constant time but doesn't preserve the order of the remaining experiments.
+        """
         exps = []
         for _ in xrange(n):
-            i = random.randint(0, self.nexps - 1)
+            i = self.rng.randint(0, self.nexps - 1)
+            last = self.nexps - 1
             
-            self.nexps -= 1
             for t in self.times:
                 self.nobs[t] -= len(self.obs[i][t])
             
-            exps.append((self.cues.pop(i), self.obs.pop(i)))
+            clamping, moved = self.cues[i], self.cues[last]
+            self.cues[i], self.cues[last] = moved, clamping
+            self.obs[i], self.obs[last] = self.obs[last], self.obs[i]
+            exps.append((self.cues.pop(), self.obs.pop()))
+            
+            duplicated = len(self.index) < self.nexps
+            self.nexps -= 1
+            
+            if self.index[clamping] == i:
+                del self.index[clamping]
+                if duplicated and clamping in self.cues:
+                    self.index[clamping] = self.cues.index(clamping)
+            
+            if i != last and self.index.get(moved) == last:
+                self.index[moved] = i
+            
+        return exps
+
+class ClampingsView(object):
+    """
+    Read-only list of clampings of a ColumnarDataset. Clampings are built on demand.
+    """
+    
+    def __init__(self, dataset):
+        self.dataset = dataset
+        
+    def __len__(self):
+        return self.dataset.nexps
+        
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.dataset.nexps
+            
+        if not 0 <= i < self.dataset.nexps:
+            raise IndexError("clamping index out of range")
+            
+        return self.dataset.clamping(i)
+        
+    def __iter__(self):
+        for i in xrange(self.dataset.nexps):
+            yield self.dataset.clamping(i)
+            
+    def __contains__(self, clamping):
+        return self.dataset.position(clamping) is not None
+        
+    def index(self, clamping):
+        i = self.dataset.position(clamping)
+        if i is None:
+            raise ValueError("%s is not in list" % str(clamping))
+            
+        return i
+
+class ColumnarDataset(object):
+    """
+    Columnar dataset backed by numpy arrays.
+    
+    Experiments are stored as a uint8 matrix of stimuli and inhibitors (in DB.get_inputs order) and a float
+    matrix of readouts where missing observations are NaN. Clampings and observations required by caspo
+    are built lazily from the matrices, so holding many datasets at once doesn't create Python objects per cell.
+    Use ColumnarDataset.from_db_rows to create an instance from a sqlite query. The number of observations
+    is the number of non-missing values unless nobs is given (see ColumnarDataset.from_db_rows).
+    """
+    interface.implements(core.IDataset, core.IClampingList)
+    
+    def __init__(self, setup, inputs, values, seed=None, nobs=None):
+        self.setup = setup
+        self.inputs = inputs
+        self.values = values
+        self.times = frozenset([1])
+        self.nexps = len(self.inputs)
+        self.nobs = defaultdict(int)
+        self.nobs[1] = int((~np.isnan(self.values)).sum()) if nobs is None else nobs
+        self.__positions = None
+        self.rng = random.Random(seed)
+        
+    @classmethod
+    def from_db_rows(cls, rows, setup):
+        """
+        Experiments with the same clamping are merged keeping the position of the first one and
+        the observations of the last one observing any readout. As in Dataset.from_db_rows,
+        observations of every row are counted, including those of merged rows.
+        """
+        cols_in = setup.stimuli + map(lambda i: i+'i', setup.inhibitors)
+        if not rows:
+            return cls(setup, np.zeros((0, len(cols_in)), dtype=np.uint8), np.zeros((0, len(setup.readouts))))
+        
+        keys = rows[0].keys()
+        table = np.array(map(tuple, rows), dtype=object)
+        
+        inputs = table[:, map(keys.index, cols_in)].astype(np.uint8)
+        values = table[:, map(keys.index, setup.readouts)].astype(float)
+        nobs = int((~np.isnan(values)).sum())
+        
+        _, first, group = np.unique(inputs, axis=0, return_index=True, return_inverse=True)
+        if len(first) < len(inputs):
+            # last row of each clamping, preferring rows with any observation as caspo merges them
+            observed = ~np.isnan(values).all(axis=1)
+            rows = np.lexsort((np.arange(len(inputs)), observed, group))
+            last = rows[np.append(np.flatnonzero(np.diff(group[rows])), len(rows) - 1)]
+            
+            order = np.argsort(first)
+            inputs = inputs[first[order]]
+            values = values[last[order]]
+        
+        return cls(setup, inputs, values, nobs=nobs)
+        
+    def get_inputs(self, clamping):
+        dc = dict(clamping)
+        return [1 if dc[s] == 1 else 0 for s in self.setup.stimuli] + [1 if i in dc else 0 for i in self.setup.inhibitors]
+        
+    def position(self, clamping):
+        """
+        Returns the position of the experiment for the given clamping or None
+        """
+        if self.__positions is None:
+            self.__positions = {}
+            for i in xrange(self.nexps):
+                self.__positions.setdefault(self.inputs[i].tostring(), i)
+                
+        return self.__positions.get(np.array(self.get_inputs(clamping), dtype=np.uint8).tostring())
+        
+    def clamping(self, i):
+        nsti = len(self.setup.stimuli)
+        
+        literals = []
+        for s, v in zip(self.setup.stimuli, self.inputs[i, :nsti]):
+            literals.append(core.Literal(s, 1 if v == 1 else -1))
             
+        for inh, v in zip(self.setup.inhibitors, self.inputs[i, nsti:]):
+            if v == 1:
+                literals.append(core.Literal(inh, -1))
+                
+        return core.Clamping(literals)
+        
+    def observations(self, i):
+        return dict((r, float(v)) for r, v in zip(self.setup.readouts, self.values[i]) if not math.isnan(v))
+        
+    @property
+    def cues(self):
+        return ClampingsView(self)
+        
+    @property
+    def clampings(self):
+        return ClampingsView(self)
+        
+    def at(self, time):
+        if time not in self.times:
+            raise ValueError("The time-point %s does not exists in the dataset. Available time-points are: %s" % (time, list(self.times)))
+            
+        for i in xrange(self.nexps):
+            yield i, self.clamping(i), self.observations(i)
+            
+    def add(self, exps):
+        if not exps:
+            return
+            
+        inputs = []
+        values = []
+        for cues, obs in exps:
+            inputs.append(self.get_inputs(cues))
+            values.append([obs[1].get(r, np.nan) for r in self.setup.readouts])
+            
+        values = np.array(values, dtype=float)
+        self.inputs = np.vstack([self.inputs, np.array(inputs, dtype=np.uint8)])
+        self.values = np.vstack([self.values, values])
+        
+        self.nexps += len(exps)
+        self.nobs[1] += int((~np.isnan(values)).sum())
+        self.__positions = None
+        
+    def seed(self, seed=None):
+        self.rng.seed(seed)
+    
+    def pop_sample(self, n):
+        """
+        Removes n experiments at random swapping each one with the last row as in Dataset.pop_sample
+        """
+        exps = []
+        for _ in xrange(n):
+            i = self.rng.randint(0, self.nexps - 1)
+            last = self.nexps - 1
+            
+            obs = defaultdict(dict)
+            obs[1] = self.observations(i)
+            exps.append((self.clamping(i), obs))
+            
+            self.nobs[1] -= len(obs[1])
+            self.inputs[i] = self.inputs[last]
+            self.values[i] = self.values[last]
+            self.inputs = self.inputs[:last]
+            self.values = self.values[:last]
+            self.nexps -= 1
+        
+        self.__positions = None
         return exps
-        
\ No newline at end of file
@@ -0,0 +1,273 @@
+import re
+import tempfile
+import subprocess
+import numpy as np
+from itertools import chain
+
+from zope import component
+from pyzcasp import asp, potassco
+from caspo import core, analyze
+
+from Learner import Learner
+from ResultCache import ResultCache
+from BehaviorCache import BehaviorCache
+
+class NetworkStore(object):
+    """
+    Networks as rows of bitsets over the PKN clauses (see DB.encode_networks). Rows are written to a buffer which grows
+    up to memory MB and is appended to a temporary file once it's full, so only the networks being used are decoded
+    and small stores (e.g., subsets of a behavior) take little memory.
+    """
+    
+    def __init__(self, db, memory=256):
+        self.db = db
+        self.memory = memory
+        self.width = (len(db.get_clauses()) + 7) // 8
+        self.capacity = max(1, memory * 1024 * 1024 // self.width)
+        self.buffer = np.zeros((min(self.capacity, 1024), self.width), dtype=np.uint8)
+        self.size = 0
+        self.file = None
+        self.spilled = 0
+    
+    def __len__(self):
+        return self.spilled + self.size
+    
+    def __iter__(self):
+        for start, packed in self.chunks(1000):
+            for network in self.decode(packed):
+                yield network
+    
+    def append(self, row):
+        if self.size == len(self.buffer):
+            buffer = np.zeros((min(self.capacity, 2 * len(self.buffer)), self.width), dtype=np.uint8)
+            buffer[:self.size] = self.buffer[:self.size]
+            self.buffer = buffer
+        
+        self.buffer[self.size] = row
+        self.size += 1
+        if self.size >= self.capacity:
+            if self.file is None:
+                self.file = tempfile.TemporaryFile(prefix='sbloopy-networks-')
+            
+            self.file.seek(0, 2)
+            self.file.write(memoryview(self.buffer[:self.size]))
+            self.spilled += self.size
+            self.size = 0
+    
+    def read(self, start, n):
+        """
+        Returns n rows from the given position
+        """
+        packed = []
+        if start < self.spilled:
+            count = min(n, self.spilled - start)
+            self.file.seek(start * self.width)
+            packed.append(np.frombuffer(self.file.read(count * self.width), dtype=np.uint8).reshape(count, self.width))
+            start, n = start + count, n - count
+        
+        if n > 0:
+            packed.append(self.buffer[start - self.spilled:start - self.spilled + n].copy())
+        
+        return np.vstack(packed) if packed else np.zeros((0, self.width), dtype=np.uint8)
+    
+    def chunks(self, size):
+        """
+        Yields the position of the first row and the matrix of rows of each chunk of size rows
+        """
+        for start in xrange(0, len(self), size):
+            yield start, self.read(start, min(size, len(self) - start))
+    
+    def get(self, positions):
+        return np.vstack([self.read(i, 1) for i in positions]) if positions else np.zeros((0, self.width), dtype=np.uint8)
+    
+    def subset(self, positions):
+        """
+        Returns a new store with the rows at the given positions
+        """
+        store = NetworkStore(self.db, self.memory)
+        for i in xrange(0, len(positions), 1000):
+            for row in self.get(positions[i:i + 1000]):
+                store.append(row)
+        
+        return store
+    
+    def decode(self, packed):
+        """
+        Returns the networks of the given rows, adding their formulas to the logical names as caspo does
+        """
+        names = component.getUtility(core.ILogicalNames)
+        networks = self.db.decode_networks(packed)
+        for network in networks:
+            names.add(network.mapping.itervalues())
+        
+        return networks
+
+class Members(object):
+    """
+    Networks of a behavior (other than itself) given by their positions in a NetworkStore
+    """
+    
+    def __init__(self, store, positions):
+        self.store = store
+        self.positions = positions
+    
+    def __len__(self):
+        return len(self.positions)
+    
+    def __iter__(self):
+        for i in xrange(0, len(self.positions), 1000):
+            for network in self.store.decode(self.store.get(self.positions[i:i + 1000])):
+                yield network
+
+class Enumerator(object):
+    """
+    Enumeration of networks and their input-output behaviors with bounded memory.
+    
+    Networks are learned with the caspo encodings, but answer sets are read from the clingo output as they arrive (pyzcasp
+    only returns the whole output at the end) and each one is kept as a row of bitsets in a NetworkStore. Behaviors are
+    found by folding chunks of chunk networks: each chunk is analyzed by caspo together with one network of each behavior
+    found so far, and the other networks of each behavior are kept as positions in the store. Thus, no more than chunk
+    networks (plus one per behavior) are held as python objects at a time. If a Watchdog is set, it may kill the
+    enumeration as it does with other solver calls (see WatchedClingo).
+    """
+    
+    atom = re.compile(r'dnf\((\d+),(\d+)\)')
+    
+    # caspo learning encodings of each step (see Enumerator.arguments)
+    steps = {'opt': ['guess', 'fixpoint', 'rss', 'opt'], 'rescale': ['fixpoint', 'rss', 'rescale'], 'enum': ['guess', 'fixpoint', 'rss', 'enum']}
+    
+    def __init__(self, db, chunk=1000, memory=256):
+        self.db = db
+        self.chunk = chunk
+        self.memory = memory
+        self.process = None
+        self.watchdog = None
+    
+    def arguments(self, clingo, step, termset, **tolerance):
+        """
+        Returns the grounder and solver arguments registered by caspo for a learning step (opt, rescale or enum) over the
+        given facts, where grounder arguments of the enumeration are formatted with the tolerance (rss and size)
+        """
+        encodings = component.getUtility(asp.IEncodingRegistry).encodings(clingo.grounder)
+        arguments = component.getUtility(asp.IArgumentRegistry).arguments
+        
+        grounder_args = [termset.to_file()] + map(lambda name: encodings('caspo.learn.%s' % name), self.steps[step])
+        if tolerance:
+            grounder_args += map(lambda arg: arg.format(**tolerance), arguments(clingo.grounder)('caspo.learn.%s' % step))
+        
+        return grounder_args, arguments(clingo.solver)('caspo.learn.%s' % step)
+    
+    def optimum(self, learner):
+        """
+        Sets the optimal residual and size in the learner as caspo does before enumerating networks
+        """
+        clingo = component.getUtility(potassco.IClingo)
+        
+        grounder_args, solver_args = self.arguments(clingo, 'opt', learner.termset)
+        solutions = clingo.run("#show formula/2. #show dnf/2. #show clause/3.", grounder_args=grounder_args, solver_args=solver_args)
+        opt_size = solutions[0].score[1]
+        
+        grounder_args, solver_args = self.arguments(clingo, 'rescale', learner.termset.union(solutions[0]))
+        solutions = clingo.run(grounder_args=grounder_args, solver_args=solver_args)
+        Learner.restore_optimum(learner, (solutions[0].score[0], opt_size))
+    
+    @asp.cleanrun
+    def learn(self, learner, fit=0, size=0):
+        """
+        Returns a NetworkStore with the networks learned with the given tolerance
+        """
+        if Learner.known_optimum(learner) is None:
+            self.optimum(learner)
+        
+        opt_rss, opt_size = Learner.optimum(learner)
+        
+        clingo = component.getUtility(potassco.IClingo)
+        grounder_args, solver_args = self.arguments(clingo, 'enum', learner.termset, rss=int(opt_rss + opt_rss * fit), size=opt_size + size)
+        
+        # answer sets are read from the text output as they are printed
+        args = filter(lambda arg: not arg.startswith('--outf'), grounder_args + solver_args)
+        args = list(chain.from_iterable(map(lambda arg: arg.split(), args))) + ['-', '--outf=0']
+        
+        names = component.getUtility(core.ILogicalNames)
+        index = dict(("%s=%s" % (clause, var), i) for i, (clause, var) in enumerate(self.db.get_clauses()))
+        bits = {}
+        
+        store = NetworkStore(self.db, self.memory)
+        row = np.zeros(len(index), dtype=bool)
+        
+        if self.watchdog:
+            self.watchdog.verify()
+            
+        with tempfile.TemporaryFile() as stderr:
+            self.process = process = subprocess.Popen([clingo.prg] + args, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=stderr)
+            process.stdin.write("#show dnf/2.")
+            process.stdin.close()
+            
+            answer = False
+            for line in process.stdout:
+                if answer:
+                    row[:] = False
+                    for var, clause in self.atom.findall(line):
+                        key = (var, clause)
+                        if key not in bits:
+                            bits[key] = index["%s=%s" % (names.clauses[int(clause)], names.variables[int(var)])]
+                        
+                        row[bits[key]] = True
+                    
+                    store.append(np.packbits(row))
+                
+                answer = line.startswith('Answer:')
+            
+            process.stdout.close()
+            if process.wait() not in clingo.allowed_returncodes:
+                if self.watchdog:
+                    self.watchdog.verify()
+                    
+                stderr.seek(0)
+                raise asp.ProcessError(clingo.prg, process.returncode, "", stderr.read())
+        
+        return store
+    
+    @staticmethod
+    def fold(behaviors, candidates, dataset):
+        """
+        Adds each candidate (network, positions) to the behavior (network, positions) with the same input-output behavior,
+        or as a new behavior. Candidates are analyzed together with the network of each behavior in a single call to caspo
+        analysis (thus, behaviors must have different input-output behaviors). Returns the behaviors.
+        """
+        if not candidates:
+            return behaviors
+        
+        known = dict((BehaviorCache.fingerprint(network), positions) for network, positions in behaviors)
+        news = dict((BehaviorCache.fingerprint(network), (network, positions)) for network, positions in candidates)
+        networks = core.BooleLogicNetworkSet([network for network, positions in behaviors + candidates], update_names=False)
+        
+        for eb in analyze.behaviors(networks, dataset, potassco.IClingo):
+            group = set([BehaviorCache.fingerprint(eb)]).union(map(BehaviorCache.fingerprint, eb.networks))
+            found = sorted((news[f] for f in group if f in news), key=lambda (network, positions): positions[0])
+            positions = [p for network, ps in found for p in ps]
+            
+            representatives = [f for f in group if f in known]
+            if representatives:
+                known[representatives[0]].extend(positions)
+            elif found:
+                behaviors.append((found[0][0], positions))
+        
+        return behaviors
+    
+    def behaviors(self, store, dataset):
+        """
+        Returns the behaviors of the networks in the store (as analyze.behaviors), where the networks of each
+        behavior are given by a Members instance
+        """
+        found = []
+        for start, packed in store.chunks(self.chunk):
+            self.fold(found, [(network, [start + i]) for i, network in enumerate(store.decode(packed))], dataset)
+        
+        behaviors = ResultCache.behavior_set(store, dataset)
+        for network, positions in found:
+            eb = analyze.BooleLogicBehavior(network.variables, network.mapping)
+            eb.networks = Members(store, positions[1:])
+            behaviors.add(eb, update_names=False)
+        
+        return behaviors
@@ -0,0 +1,110 @@
+import numpy as np
+
+from Simulator import Simulator
+
+class Evaluator(object):
+    """
+    Vectorized MSE of a family of behaviors (or networks) against datasets.
+    
+    Behaviors are simulated once per clamping (see Simulator) into a behaviors x clampings x readouts tensor of
+    predictions. Datasets are given as a clampings x readouts observations matrix, NaN if missing, and the MSE of
+    every behavior is computed in a single numpy pass over the tensor. Clampings are looked up among the ones
+    simulated before, so scoring the same behaviors against several datasets (e.g. learning and testing data)
+    only simulates the union of their clampings. Experiments of columnar datasets are clamped directly from
+    their matrix of inputs, without building clampings. As in caspo, each behavior is weighted by its number
+    of networks. Behaviors with cycles cannot be simulated (see Simulator), in which case MSEs are given by caspo
+    (BooleLogicBehaviorSet.mse and itermses).
+    """
+    
+    def __init__(self, behaviors, setup):
+        self.behaviors = behaviors
+        self.setup = setup
+        self.readouts = list(setup.readouts)
+        self.simulators = [Simulator(behavior, self.readouts) for behavior in behaviors]
+        self.weights = np.array([len(behavior) for behavior in behaviors], dtype=float)
+        self.acyclic = all(simulator.acyclic for simulator in self.simulators)
+        self.index = {}
+        self.predictions = np.zeros((len(self.simulators), 0, len(self.readouts)), dtype=np.uint8)
+    
+    def __len__(self):
+        return len(self.simulators)
+    
+    def predict(self, clampings):
+        """
+        Returns the predictions tensor (behaviors x clampings x readouts) for a list of clampings or
+        a matrix of inputs as held by ColumnarDataset
+        """
+        columnar = isinstance(clampings, np.ndarray)
+        keys = map(np.ndarray.tostring, clampings) if columnar else clampings
+        
+        new = []
+        for i, key in enumerate(keys):
+            if key not in self.index:
+                self.index[key] = self.predictions.shape[1] + len(new)
+                new.append(i)
+        
+        if new:
+            if columnar:
+                clamp = lambda simulator: simulator.clamp_inputs(clampings[new], self.setup.stimuli, self.setup.inhibitors)
+            else:
+                clamp = lambda simulator: simulator.clamp([clampings[i] for i in new])
+            
+            tensor = np.array([simulator.readout(simulator.fixpoint(*clamp(simulator))).T for simulator in self.simulators], dtype=np.uint8)
+            self.predictions = np.concatenate([self.predictions, tensor.reshape(len(self), len(new), len(self.readouts))], axis=1)
+        
+        return self.predictions[:, [self.index[key] for key in keys]]
+    
+    def observations(self, dataset, time):
+        """
+        Returns the clampings (or the matrix of inputs of a ColumnarDataset) and the observations matrix
+        (clampings x readouts, NaN if missing) of a dataset
+        """
+        if not hasattr(dataset, 'inputs'):
+            clampings, observations = Simulator.observations(dataset, time, self.readouts)
+            return clampings, np.ascontiguousarray(observations.T)
+        
+        # raises ValueError for time-points not in the dataset as Dataset.at
+        next(dataset.at(time), None)
+        
+        observations = np.empty((dataset.nexps, len(self.readouts)))
+        observations[:] = np.nan
+        for j, readout in enumerate(self.readouts):
+            if readout in dataset.setup.readouts:
+                observations[:, j] = dataset.values[:, dataset.setup.readouts.index(readout)]
+        
+        return dataset.inputs, observations
+    
+    @staticmethod
+    def score(predictions, observations, nobs, weights=None):
+        """
+        Returns the MSE of each predictions matrix in a tensor (n x clampings x readouts) with respect to the
+        observations matrix (clampings x readouts, NaN if missing) having nobs observations. If weights are given,
+        returns the MSE of the weighted average of the predictions instead (as BooleLogicBehaviorSet.mse).
+        """
+        if weights is not None:
+            predictions = np.tensordot(weights, predictions, axes=1)[np.newaxis] / weights.sum()
+        
+        residuals = predictions - observations
+        residuals[:, np.isnan(observations)] = 0
+        return (residuals ** 2).reshape(len(residuals), -1).sum(axis=1) / nobs
+    
+    def mses(self, dataset, time):
+        """
+        Returns the MSE of each behavior with respect to the given dataset at the given time-point
+        """
+        if not self.acyclic:
+            return np.array([mse for behavior, mse in self.behaviors.itermses(dataset, time)])
+        
+        clampings, observations = self.observations(dataset, time)
+        return self.score(self.predict(clampings), observations, dataset.nobs[time])
+    
+    def mse(self, dataset, time):
+        """
+        Returns the MSE of the behaviors with respect to the given dataset at the given time-point
+        as in BooleLogicBehaviorSet.mse
+        """
+        if not self.acyclic:
+            return self.behaviors.mse(dataset, time)
+        
+        clampings, observations = self.observations(dataset, time)
+        return self.score(self.predict(clampings), observations, dataset.nobs[time], self.weights)[0]
@@ -0,0 +1,79 @@
+import csv
+import random
+
+class Generator(object):
+    """
+    Random PKN and experimental setup of a given size, written as SIF and MIDAS files for scale testing.
+    
+    Nodes are named S1.. for stimuli, N1.. for other nodes and R1.. for readouts. They are arranged in a random
+    order with stimuli first and readouts last. Every node but stimuli gets between 1 and indegree edges from
+    previous nodes (negative with the given probability), and every node but readouts gets at least one edge
+    to a following node. Thus, the PKN is acyclic, all nodes are reachable from stimuli and all nodes reach
+    some readout. Inhibitors are chosen among the nodes which are neither stimuli nor readouts.
+    
+    Note that insilico benchmarks are simulated over all clampings of stimuli and inhibitors (2^(stimuli+inhibitors)
+    experiments).
+    """
+    
+    def __init__(self, nodes, stimuli, inhibitors, readouts, indegree=2, negative=0.2, seed=None):
+        if stimuli < 1 or readouts < 1 or indegree < 1:
+            raise ValueError("At least one stimulus, one readout and one incoming edge per node are required")
+        
+        if stimuli + readouts > nodes:
+            raise ValueError("Cannot have %s stimuli and %s readouts among %s nodes" % (stimuli, readouts, nodes))
+        
+        if inhibitors > nodes - stimuli - readouts:
+            raise ValueError("Cannot have %s inhibitors among %s nodes which are neither stimuli nor readouts" % (inhibitors, nodes - stimuli - readouts))
+        
+        self.random = random.Random(seed)
+        
+        self.stimuli = ["S%s" % i for i in xrange(1, stimuli + 1)]
+        self.readouts = ["R%s" % i for i in xrange(1, readouts + 1)]
+        
+        internals = ["N%s" % i for i in xrange(1, nodes - stimuli - readouts + 1)]
+        self.inhibitors = sorted(self.random.sample(internals, inhibitors), key=lambda n: int(n[1:]))
+        
+        self.random.shuffle(internals)
+        self.nodes = self.stimuli + internals + self.readouts
+        self.edges = self.generate(indegree, negative)
+    
+    def generate(self, indegree, negative):
+        """
+        Returns the list of edges (source, sign, target)
+        """
+        sign = lambda: -1 if self.random.random() < negative else 1
+        last = len(self.nodes) - len(self.readouts)
+        
+        edges = {}
+        for i in xrange(len(self.stimuli), len(self.nodes)):
+            sources = self.nodes[:min(i, last)]
+            for source in self.random.sample(sources, self.random.randint(1, min(indegree, len(sources)))):
+                edges[(source, self.nodes[i])] = sign()
+        
+        sources = set(source for source, target in edges)
+        for i in xrange(last):
+            if self.nodes[i] not in sources:
+                edges[(self.nodes[i], self.random.choice(self.nodes[max(i + 1, len(self.stimuli)):]))] = sign()
+        
+        position = dict((node, i) for i, node in enumerate(self.nodes))
+        return [(source, s, target) for (source, target), s in sorted(edges.iteritems(), key=lambda ((source, target), s): (position[source], position[target]))]
+    
+    def write_sif(self, filename):
+        with open(filename, 'w') as f:
+            for source, sign, target in self.edges:
+                f.write("%s\t%s\t%s\n" % (source, sign, target))
+    
+    def write_midas(self, filename):
+        """
+        Writes the setup with the control and single stimulus or single inhibitor experiments at time 0
+        (only the setup is used for insilico benchmarks).
+        """
+        header = ["TR:Synthetic:CellLine"] + map(lambda s: "TR:" + s, self.stimuli) + map(lambda i: "TR:%si" % i, self.inhibitors) \
+               + map(lambda r: "DA:" + r, self.readouts) + map(lambda r: "DV:" + r, self.readouts)
+        
+        cues = self.stimuli + self.inhibitors
+        with open(filename, 'wb') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            for j in xrange(-1, len(cues)):
+                writer.writerow([1] + [1 if i == j else 0 for i in xrange(len(cues))] + [0] * len(self.readouts) + ["%f" % 0] * len(self.readouts))
@@ -0,0 +1,77 @@
+from zope import component
+from pyzcasp import asp
+from caspo import core, learn
+
+class Learner(object):
+    """
+    Learning session reused across the iterations of a benchmark.
+    
+    learn.learner compresses the PKN and builds the facts describing it (logical names and setup) every time
+    it's called. Since only the dataset changes between iterations, the session builds those facts once and
+    each call to Learner.learner only adds the facts for the experiments in the given dataset.
+    The solver runs as a separate process for each call, so the whole instance is still grounded every time.
+    """
+    
+    def __init__(self, pkn, setup, length, isolver, discretization='round', factor=100):
+        self.solver = isolver
+        self.discretize = component.createObject(discretization, factor)
+        
+        graph = component.getMultiAdapter((pkn, setup), core.IGraph)
+        names = component.getUtility(core.ILogicalNames)
+        names.load(graph, length)
+        
+        self.termset = asp.ITermSet(names).union(asp.ITermSet(setup))
+        self.termset.add(asp.Term('dfactor', [self.discretize.factor]))
+    
+    def get_termset(self, dataset, time):
+        """
+        Returns the facts for the experiments in the dataset as in caspo's Dataset2TermSet
+        """
+        termset = asp.TermSet()
+        
+        names = {}
+        for i, clamping, obs in dataset.at(time):
+            name = names.setdefault(clamping, i)
+            termset.add(asp.Term('exp', [i]))
+            for var, val in clamping:
+                termset.add(asp.Term('clamped', [name, var, val]))
+            
+            for readout, value in obs.iteritems():
+                termset.add(asp.Term('obs', [i, readout, self.discretize(value)]))
+        
+        return termset
+    
+    def learner(self, dataset, time=1):
+        """
+        Returns a caspo learner for the dataset at the given time-point
+        """
+        instance = self.termset.union(self.get_termset(dataset, time))
+        return component.getMultiAdapter((instance, component.getUtility(self.solver)), learn.ILearner)
+    
+    @staticmethod
+    def known_optimum(learner):
+        """
+        Returns the optimal residual and size of a caspo learner, or None until they are found (by its first
+        call to learn) or restored (see Learner.restore_optimum)
+        """
+        optimal = getattr(learner, 'optimal', None)
+        return tuple(optimal) if optimal else None
+    
+    @staticmethod
+    def optimum(learner):
+        """
+        Returns the optimal residual and size of a caspo learner. Raises ValueError if they're unknown.
+        """
+        optimal = Learner.known_optimum(learner)
+        if optimal is None:
+            raise ValueError("The optimum of the learner is unknown until it learns networks or the optimum is restored")
+        
+        return optimal
+    
+    @staticmethod
+    def restore_optimum(learner, optimal):
+        """
+        Sets the optimum of a caspo learner (e.g. from a cache) unless it's known already, so that it only enumerates
+        """
+        if Learner.known_optimum(learner) is None:
+            learner.optimal = tuple(optimal)
@@ -0,0 +1,238 @@
+import sqlite3 as lite
+
+import os
+import time
+import json
+import zlib
+import hashlib
+import threading
+
+from zope import component, interface
+from pyzcasp import potassco
+from caspo import core, analyze
+
+from Learner import Learner
+
+class ClampingList(object):
+    """
+    Experimental design restored from the cache (as the designs returned by caspo)
+    """
+    interface.implements(core.IClampingList)
+    
+    def __init__(self, clampings):
+        self.clampings = clampings
+
+class ResultCache(object):
+    """
+    On-disk cache of learning, analysis and design results.
+    
+    Results are stored in a sqlite database under a key given by the hash of all inputs of the solver call
+    (see ResultCache.digest). Values are compressed JSON, where networks are mappings from variables to clauses
+    strings and experiments are lists of literals strings. The total size of the values is kept under size MB
+    by removing the least recently used ones. Connections are handled per process as in DB.connect, with the
+    journal mode of the DB so that workers on several hosts can share the cache of the main DB.
+    """
+    
+    version = 1
+    
+    def __init__(self, name, size=512, timeout=300, journal_mode='WAL'):
+        self.name = name
+        self.size = size * 1024 * 1024
+        self.timeout = timeout
+        self.journal_mode = journal_mode
+        self.__local = threading.local()
+        
+        con = self.connect()
+        with con:
+            con.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value BLOB, bytes INT, used REAL)")
+            con.execute("CREATE INDEX IF NOT EXISTS results_used ON results (used)")
+    
+    def connect(self):
+        if getattr(self.__local, 'pid', None) != os.getpid():
+            con = lite.connect(self.name, timeout=self.timeout)
+            con.execute("PRAGMA journal_mode=%s" % self.journal_mode)
+            con.execute("PRAGMA synchronous=NORMAL")
+            
+            self.__local.con = con
+            self.__local.pid = os.getpid()
+        
+        return self.__local.con
+    
+    def close(self):
+        if getattr(self.__local, 'pid', None) == os.getpid():
+            self.__local.con.close()
+        
+        self.__local.con = None
+        self.__local.pid = None
+    
+    def digest(self, *inputs):
+        """
+        Returns the key for the given inputs, which must be serializable as JSON
+        """
+        return hashlib.sha1(json.dumps([self.version] + list(inputs), sort_keys=True)).hexdigest()
+    
+    def get(self, key):
+        """
+        Returns the value stored under the key or None
+        """
+        con = self.connect()
+        with con:
+            row = con.execute("SELECT value FROM results WHERE key=?", (key,)).fetchone()
+            if row is None:
+                return None
+            
+            con.execute("UPDATE results SET used=? WHERE key=?", (time.time(), key))
+        
+        return json.loads(zlib.decompress(row[0]))
+    
+    def put(self, key, value):
+        blob = zlib.compress(json.dumps(value))
+        
+        con = self.connect()
+        with con:
+            con.execute("INSERT OR REPLACE INTO results VALUES (?,?,?,?)", (key, lite.Binary(blob), len(blob), time.time()))
+            
+            total = con.execute("SELECT TOTAL(bytes) FROM results").fetchone()[0]
+            if total > self.size:
+                evict = []
+                for old, nbytes in con.execute("SELECT key, bytes FROM results ORDER BY used").fetchall():
+                    if total <= self.size:
+                        break
+                    
+                    evict.append((old,))
+                    total -= nbytes
+                
+                con.executemany("DELETE FROM results WHERE key=?", evict)
+    
+    @staticmethod
+    def dump_network(network):
+        return dict((var, sorted(map(str, formula))) for var, formula in network.mapping.iteritems())
+    
+    @staticmethod
+    def load_network(mapping):
+        names = component.getUtility(core.ILogicalNames)
+        network = core.BooleLogicNetwork(names.variables, dict((str(var), map(lambda c: core.Clause.from_str(str(c)), formula)) for var, formula in mapping.iteritems()))
+        names.add(network.mapping.itervalues())
+        
+        return network
+    
+    @staticmethod
+    def dump_clamping(clamping):
+        return sorted(map(str, clamping))
+    
+    @staticmethod
+    def load_clamping(literals):
+        return core.Clamping(map(lambda l: core.Literal.from_str(str(l)), literals))
+    
+    @staticmethod
+    def dump_dataset(dataset, time=1):
+        return [(ResultCache.dump_clamping(clamping), sorted(obs.iteritems())) for i, clamping, obs in dataset.at(time)]
+    
+    def learn(self, learner, inputs, fit, size):
+        """
+        Learns networks with the given tolerance unless they are in the cache.
+        The optimum is cached as well and restored in the learner so that further calls only enumerate.
+        """
+        key = self.digest('learn', inputs, fit, size)
+        value = self.get(key)
+        if value is None:
+            networks = learner.learn(fit, size)
+            self.put(key, {'optimal': Learner.optimum(learner), 'networks': map(self.dump_network, networks)})
+            return networks
+        
+        Learner.restore_optimum(learner, value['optimal'])
+        
+        return core.BooleLogicNetworkSet(map(self.load_network, value['networks']), update_names=False)
+    
+    @staticmethod
+    def sort_networks(networks):
+        """
+        Returns the serializations of the networks and the networks sorted by them
+        """
+        dumps = map(lambda network: json.dumps(ResultCache.dump_network(network), sort_keys=True), networks)
+        networks = [network for dump, network in sorted(zip(dumps, networks), key=lambda (dump, network): dump)]
+        dumps.sort()
+        
+        return dumps, networks
+    
+    @staticmethod
+    def dump_behaviors(dumps, behaviors):
+        """
+        Returns the behaviors as groups of positions of networks in the sorted serializations (see ResultCache.sort_networks),
+        the first one being the representative of the behavior
+        """
+        position = dict((dump, i) for i, dump in enumerate(dumps))
+        dump = lambda network: position[json.dumps(ResultCache.dump_network(network), sort_keys=True)]
+        
+        return [[dump(eb)] + sorted(set(map(dump, eb.networks)) - set([dump(eb)])) for eb in behaviors]
+    
+    @staticmethod
+    def behavior_set(networks, dataset):
+        """
+        Returns a set of behaviors without behaviors for the networks (any iterable) as given by caspo analysis,
+        i.e. with the networks and their active and inactive cues. Behaviors are added afterwards.
+        """
+        # caspo runs the analysis while adapting the networks, so the adapter is built without networks
+        behaviors = component.getMultiAdapter((core.BooleLogicNetworkSet(), dataset, component.getUtility(potassco.IClingo)), analyze.IBooleLogicBehaviorSet)
+        behaviors.networks = networks
+        
+        cues = set(dataset.setup.stimuli + dataset.setup.inhibitors)
+        for network in networks:
+            for formula in network.mapping.itervalues():
+                for clause in formula:
+                    behaviors.active_cues.update(src for src, sign in clause if src in cues)
+        
+        behaviors.inactive_cues = cues.difference(behaviors.active_cues)
+        return behaviors
+    
+    @staticmethod
+    def load_behaviors(networks, dataset, groups):
+        """
+        Returns the behaviors given by groups of positions of the sorted networks (see ResultCache.dump_behaviors)
+        """
+        behaviors = ResultCache.behavior_set(core.BooleLogicNetworkSet(networks, update_names=False), dataset)
+        for group in groups:
+            eb = analyze.BooleLogicBehavior(networks[group[0]].variables, networks[group[0]].mapping)
+            eb.networks = set(networks[i] for i in group[1:])
+            behaviors.add(eb, update_names=False)
+        
+        return behaviors
+    
+    @staticmethod
+    def dump_designs(exps):
+        return map(lambda e: map(ResultCache.dump_clamping, e.clampings), exps) if exps else exps
+    
+    @staticmethod
+    def load_designs(designs):
+        if not designs:
+            return designs
+        
+        return [ClampingList(map(ResultCache.load_clamping, clampings)) for clampings in designs]
+    
+    def behaviors(self, analysis, networks, dataset, inputs):
+        """
+        Returns the behaviors of the networks given by the analysis function unless they are in the cache
+        """
+        dumps, networks = self.sort_networks(networks)
+        
+        key = self.digest('behaviors', inputs, dumps)
+        value = self.get(key)
+        if value is None:
+            behaviors = analysis(core.BooleLogicNetworkSet(networks, update_names=False), dataset)
+            self.put(key, self.dump_behaviors(dumps, behaviors))
+            return behaviors
+        
+        return self.load_behaviors(networks, dataset, value)
+    
+    def design(self, designer, inputs, behaviors, **kwargs):
+        """
+        Returns the experimental designs for the behaviors unless they are in the cache
+        """
+        key = self.digest('design', inputs, sorted(json.dumps(self.dump_network(eb), sort_keys=True) for eb in behaviors), kwargs)
+        value = self.get(key)
+        if value is None:
+            exps = designer.design(**kwargs)
+            self.put(key, {'designs': self.dump_designs(exps)})
+            return exps
+        
+        return self.load_designs(value['designs'])
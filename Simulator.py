@@ -0,0 +1,176 @@
+import numpy as np
+
+class Simulator(object):
+    """
+    Vectorized simulator for Boolean logic networks.
+    
+    The network mapping is compiled once into index arrays over its variables. Then, all given clampings
+    are evaluated at once on a variables x clampings boolean matrix, iterating synchronous updates until
+    the fixpoint is reached. For acyclic networks, this yields the same values as BooleLogicNetwork.prediction.
+    Synchronous updates of networks with cycles may oscillate or reach a different fixpoint, so the acyclic
+    attribute tells whether the network can be simulated: otherwise, Simulator.fixpoint raises ValueError and
+    predictions are given by caspo (BooleLogicNetwork.prediction) one at a time. The size attribute is the number
+    of literals in all clauses, i.e. the size minimized by caspo learning.
+    """
+    
+    def __init__(self, network, readouts):
+        self.network = network
+        self.readouts = list(readouts)
+        
+        variables = set(self.readouts)
+        for var, formula in network.mapping.iteritems():
+            variables.add(var)
+            for clause in formula:
+                variables.update(map(lambda (src, sign): src, clause))
+        
+        self.variables = sorted(variables)
+        self.index = dict((var, i) for i, var in enumerate(self.variables))
+        
+        self.size = 0
+        self.formulas = []
+        for var, formula in network.mapping.iteritems():
+            clauses = []
+            for clause in formula:
+                pos = np.array([self.index[src] for src, sign in clause if sign == 1], dtype=int)
+                neg = np.array([self.index[src] for src, sign in clause if sign != 1], dtype=int)
+                clauses.append((pos, neg))
+                self.size += len(pos) + len(neg)
+            
+            self.formulas.append((self.index[var], clauses))
+        
+        self.acyclic = self.is_acyclic(network)
+    
+    @staticmethod
+    def is_acyclic(network):
+        """
+        Returns whether the variables of the network can be sorted so that each one only depends on the ones before it
+        """
+        pending = dict((var, set(src for clause in formula for src, sign in clause)) for var, formula in network.mapping.iteritems())
+        # variables without a formula are inputs to the network
+        done = set(src for sources in pending.itervalues() for src in sources).difference(pending)
+        
+        while pending:
+            ready = [var for var, sources in pending.iteritems() if sources <= done]
+            if not ready:
+                return False
+            
+            for var in ready:
+                done.add(var)
+                del pending[var]
+        
+        return True
+    
+    def clamp(self, clampings):
+        """
+        Returns the clamped values and the clamped mask (variables x clampings) for a list of clampings
+        """
+        values = np.zeros((len(self.variables), len(clampings)), dtype=bool)
+        mask = np.zeros((len(self.variables), len(clampings)), dtype=bool)
+        
+        for j, clamping in enumerate(clampings):
+            for var, sign in clamping:
+                if var in self.index:
+                    mask[self.index[var], j] = True
+                    values[self.index[var], j] = sign == 1
+        
+        return values, mask
+    
+    def clamp_inputs(self, inputs, stimuli, inhibitors):
+        """
+        Returns the clamped values and the clamped mask (variables x clampings) for a matrix of inputs
+        (clampings x stimuli and inhibitors) as held by ColumnarDataset
+        """
+        values = np.zeros((len(self.variables), len(inputs)), dtype=bool)
+        mask = np.zeros((len(self.variables), len(inputs)), dtype=bool)
+        
+        for k, var in enumerate(stimuli):
+            if var in self.index:
+                mask[self.index[var]] = True
+                values[self.index[var]] = inputs[:, k] == 1
+        
+        for k, var in enumerate(inhibitors, len(stimuli)):
+            if var in self.index:
+                mask[self.index[var]] = inputs[:, k] == 1
+        
+        return values, mask
+    
+    def simulate(self, clampings):
+        """
+        Returns the fixpoint values (variables x clampings) for a list of clampings
+        """
+        return self.fixpoint(*self.clamp(clampings))
+    
+    def fixpoint(self, values, mask):
+        """
+        Returns the fixpoint values (variables x clampings) for the clamped values and mask.
+        Raises ValueError if the network has cycles.
+        """
+        if not self.acyclic:
+            raise ValueError("Networks with cycles cannot be simulated by synchronous updates")
+        
+        free = ~mask
+        
+        state = values.copy()
+        for _ in xrange(len(self.variables) + 1):
+            update = np.zeros_like(state)
+            for i, clauses in self.formulas:
+                for pos, neg in clauses:
+                    update[i] |= state[pos].all(axis=0) & ~state[neg].any(axis=0)
+            
+            update = np.where(free, update, values)
+            if (update == state).all():
+                break
+            
+            state = update
+        
+        return state
+    
+    def predictions(self, clampings):
+        """
+        Returns the predictions matrix (readouts x clampings) for a list of clampings
+        """
+        if not self.acyclic:
+            predictions = [[self.network.prediction(readout, clamping) for clamping in clampings] for readout in self.readouts]
+            return np.array(predictions, dtype=np.uint8).reshape(len(self.readouts), len(clampings))
+        
+        return self.readout(self.simulate(clampings))
+    
+    def readout(self, state):
+        """
+        Returns the predictions matrix (readouts x clampings) for the given fixpoint values
+        """
+        return state[[self.index[r] for r in self.readouts]].astype(np.uint8)
+    
+    @staticmethod
+    def observations(dataset, time, readouts):
+        """
+        Returns the clampings and the observations matrix (readouts x clampings, NaN if missing) of a dataset
+        """
+        observations = np.empty((len(readouts), dataset.nexps))
+        observations[:] = np.nan
+        
+        clampings = []
+        for i, clamping, obs in dataset.at(time):
+            clampings.append(clamping)
+            for j, readout in enumerate(readouts):
+                if readout in obs:
+                    observations[j, i] = obs[readout]
+        
+        return clampings, observations
+    
+    def mse(self, dataset, time):
+        """
+        Returns the MSE with respect to the given dataset at the given time-point as in BooleLogicNetwork.mse
+        """
+        clampings, observations = self.observations(dataset, time, self.readouts)
+        
+        rss = np.nansum((self.predictions(clampings) - observations) ** 2)
+        return rss / dataset.nobs[time]
+    
+    def rss(self, clampings, observations, factor):
+        """
+        Returns the residual sum of squares minimized by caspo learning for the given clampings and
+        discretized observations (readouts x clampings, NaN if missing) using the discretization factor
+        """
+        predictions = self.predictions(clampings).astype(int) * factor
+        return int(np.nansum((predictions - observations) ** 2))
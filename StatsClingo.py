@@ -0,0 +1,102 @@
+import re
+import json
+import subprocess
+from itertools import chain
+from collections import OrderedDict
+
+from pyzcasp import asp, potassco
+
+class WatchedClingo(potassco.Clingo):
+    """
+    Clingo solver keeping the Popen of its last call in the process attribute, so that a Watchdog can kill it.
+    
+    Calls run clingo as pyzcasp does (strict arguments override the given ones and the JSON output is loaded in the
+    json attribute). If a Watchdog is set, calls raise BudgetExceeded once the budget of the phase being watched is
+    exceeded (killing the solver if it's running).
+    """
+    
+    def __init__(self, prg, allowed_returncodes=[10,20,30], strict_args=None):
+        super(WatchedClingo, self).__init__(prg, allowed_returncodes, strict_args)
+        self.process = None
+        self.watchdog = None
+    
+    def execute(self, stdin, *args):
+        if self.watchdog:
+            self.watchdog.verify()
+        
+        largs = list(args)
+        for strict, value in self.strict_args.iteritems():
+            largs = filter(lambda arg: not arg.startswith(strict), largs)
+            largs.append("{0}={1}".format(strict, value) if value else strict)
+        
+        args = list(chain.from_iterable(map(lambda arg: arg.split(), largs)))
+        try:
+            self.process = subprocess.Popen([self.prg] + args, stdin=subprocess.PIPE, stderr=subprocess.PIPE, stdout=subprocess.PIPE)
+        except OSError as e:
+            if e.errno == 2:
+                raise Exception('Program \'%s\' not found' % self.prg)
+            
+            raise
+        
+        stdout, stderr = self.process.communicate(stdin)
+        code = self.process.returncode
+        # clingo interrupted (e.g., by a time limit) still prints its output
+        if code not in self.allowed_returncodes and code != 11:
+            if self.watchdog:
+                self.watchdog.verify()
+            
+            raise asp.ProcessError(self.prg, code, stdout, stderr)
+        
+        self.json = json.loads(stdout)
+        return stdout, code
+
+class StatsClingo(WatchedClingo):
+    """
+    Clingo solver requesting statistics of every call (--stats).
+    
+    Statistics are parsed from the JSON output of each call and added up in the totals attribute: number of calls,
+    grounding time (total time minus solving time), solving time, CPU time, choices, conflicts and models enumerated,
+    together with the number of threads used by the last call. Use StatsClingo.since to get the statistics of the calls
+    made after a given snapshot.
+    Calls made by analysis pools (caspo analysis with threads) run in child processes and aren't counted.
+    """
+    
+    fields = ['calls', 'ground', 'solve', 'cpu', 'choices', 'conflicts', 'models', 'threads']
+    threads_arg = re.compile(r'(?:^|\s)(?:-t|--parallel-mode)[\s=]*(\d+)')
+    
+    def __init__(self, prg, allowed_returncodes=[10,20,30], strict_args=None):
+        strict_args = dict(strict_args or {})
+        strict_args['--stats'] = None
+        
+        super(StatsClingo, self).__init__(prg, allowed_returncodes, strict_args)
+        self.totals = OrderedDict.fromkeys(self.fields, 0)
+    
+    def execute(self, stdin, *args):
+        stdout, code = super(StatsClingo, self).execute(stdin, *args)
+        
+        output = json.loads(stdout)
+        times = output.get('Time', {})
+        stats = output.get('Stats', {})
+        core = stats.get('Core', stats)
+        threads = self.threads_arg.search(" ".join(args))
+        
+        self.totals['calls'] += 1
+        self.totals['ground'] += max(times.get('Total', 0) - times.get('Solve', 0), 0)
+        self.totals['solve'] += times.get('Solve', 0)
+        self.totals['cpu'] += times.get('CPU', 0)
+        self.totals['choices'] += core.get('Choices', 0)
+        self.totals['conflicts'] += core.get('Conflicts', 0)
+        self.totals['models'] += output.get('Models', {}).get('Number', 0)
+        self.totals['threads'] = int(threads.group(1)) if threads else 1
+        
+        return stdout, code
+    
+    def since(self, snapshot):
+        """
+        Returns the statistics of the calls made after the snapshot (a copy of totals).
+        The number of threads is the one used by the last call (or 0 if there were no calls).
+        """
+        stats = OrderedDict((f, self.totals[f] - snapshot[f]) for f in self.fields)
+        stats['threads'] = self.totals['threads'] if stats['calls'] else 0
+        
+        return stats
@@ -0,0 +1,153 @@
+import os
+import time
+import json
+import inspect
+import resource
+from contextlib import contextmanager
+from collections import OrderedDict
+
+class Timings(object):
+    """
+    Wall time, CPU time and peak memory of each phase of a benchmark iteration.
+    
+    Use Timings.phase to measure a block of code. Measures of the same phase are added up until Timings.flush
+    stores one row per phase in the benchmark_timings table (and optionally appends them to a JSON-lines file).
+    CPU time of solver subprocesses (clingo and analysis pools) is measured as the time of terminated children.
+    Phases may be nested (e.g., DB calls within learning), in which case times of the nested phase are not counted
+    in the enclosing one, so that phases add up to the whole run.
+    Peak RSS (in KB) is the high-water mark of this process, which is reset when a top-level workflow phase starts
+    (this needs /proc/self/clear_refs, otherwise it's the peak up to the end of the phase). Thus, it's the peak of
+    the phase for workflow phases and the peak of the enclosing phase so far for nested phases and DB calls.
+    Solver RSS is that of the largest terminated child up to the end of the phase.
+    Counts of networks and behaviors are those given by the last measure of the phase.
+    If a StatsClingo solver is given, the statistics of its calls during each phase are stored as well
+    in the benchmark_solver table.
+    """
+    
+    fields = ['calls', 'wall', 'cpu', 'solver', 'rss', 'solver_rss', 'networks', 'behaviors']
+    
+    def __init__(self, db, filename=None, solver=None):
+        self.db = db
+        self.filename = filename
+        self.solver = solver
+        self.records = OrderedDict()
+        self.stats = OrderedDict()
+        self.stack = []
+    
+    @contextmanager
+    def phase(self, name, peak=True):
+        """
+        Measures the phase name. It yields a dict where networks and behaviors counts can be set.
+        Time spent in phases nested in this one (e.g., DB calls during learning) is measured only in the nested phase.
+        Unless peak is False (e.g., for DB calls), a top-level phase resets the high-water mark to get its own peak RSS.
+        """
+        record = self.records.setdefault(name, dict.fromkeys(self.fields, 0))
+        counts = {}
+        snapshot = self.solver.totals.copy() if self.solver else None
+        
+        if peak and not self.stack:
+            self.reset_hwm()
+        
+        frame = dict.fromkeys(['wall', 'cpu', 'solver'], 0)
+        self.stack.append(frame)
+        
+        wall = time.time()
+        start = os.times()
+        try:
+            yield counts
+        finally:
+            end = os.times()
+            self.stack.pop()
+            
+            elapsed = {'wall': time.time() - wall,
+                       'cpu': (end[0] - start[0]) + (end[1] - start[1]),
+                       'solver': (end[2] - start[2]) + (end[3] - start[3])}
+            record['calls'] += 1
+            for f in ['wall', 'cpu', 'solver']:
+                record[f] += elapsed[f] - frame[f]
+            
+            record['rss'] = max(record['rss'], self.hwm())
+            record['solver_rss'] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+            record.update(counts)
+            
+            if self.stack:
+                parent = self.stack[-1]
+                for f in ['wall', 'cpu', 'solver']:
+                    parent[f] += elapsed[f]
+            
+            if self.solver:
+                stats = self.solver.since(snapshot)
+                if stats['calls']:
+                    total = self.stats.setdefault(name, dict.fromkeys(self.solver.fields, 0))
+                    for f in self.solver.fields:
+                        total[f] = stats[f] if f == 'threads' else total[f] + stats[f]
+    
+    def hwm(self):
+        """
+        Returns the RSS high-water mark in KB of this process since the last Timings.reset_hwm
+        (or since the process started if it cannot be reset)
+        """
+        try:
+            with open('/proc/self/status') as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        return int(line.split()[1])
+        except (IOError, ValueError):
+            pass
+        
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    
+    def reset_hwm(self):
+        """
+        Resets the RSS high-water mark of this process to its current RSS (Linux only)
+        """
+        try:
+            with open('/proc/self/clear_refs', 'w') as f:
+                f.write('5')
+        except IOError:
+            pass
+    
+    def flush(self, idmodel, it, run=None):
+        """
+        Stores the measured phases for the iteration (and random run) and starts over
+        """
+        rows = [(idmodel, it, run, phase) + tuple(record[f] for f in self.fields) for phase, record in self.records.iteritems()]
+        stats = [(idmodel, it, run, phase) + tuple(total[f] for f in self.solver.fields) for phase, total in self.stats.iteritems()]
+        
+        if rows:
+            self.db.insert_timings(rows)
+        
+        if stats:
+            self.db.insert_solver_stats(stats)
+        
+        if rows and self.filename:
+            with open(self.filename, 'a') as f:
+                for row in rows:
+                    line = dict(zip(['idmodel', 'it', 'run', 'phase'] + self.fields, row))
+                    if row[3] in self.stats:
+                        line['clingo'] = self.stats[row[3]]
+                    
+                    f.write(json.dumps(line) + "\n")
+        
+        self.records = OrderedDict()
+        self.stats = OrderedDict()
+
+class TimedDB(object):
+    """
+    Proxy to a DB instance measuring every method call as the db phase of the given Timings
+    """
+    
+    def __init__(self, db, timings):
+        self.db = db
+        self.timings = timings
+    
+    def __getattr__(self, name):
+        attr = getattr(self.db, name)
+        if not inspect.ismethod(attr):
+            return attr
+        
+        def timed(*args, **kwargs):
+            with self.timings.phase('db', peak=False):
+                return attr(*args, **kwargs)
+        
+        return timed
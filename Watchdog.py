@@ -0,0 +1,138 @@
+import os
+import time
+import atexit
+import threading
+from contextlib import contextmanager
+
+class BudgetExceeded(Exception):
+    """
+    Raised by solver calls of a phase which exceeded its wall-clock (seconds) or memory (MB) budget
+    """
+    
+    def __init__(self, phase, budget, used, allowed):
+        super(BudgetExceeded, self).__init__(phase, budget, used, allowed)
+        self.phase = phase
+        self.budget = budget
+        self.used = used
+        self.allowed = allowed
+    
+    def __str__(self):
+        unit = "s" if self.budget == 'wall' else " MB"
+        return "%s budget of %s exceeded (%.1f%s, allowed %s%s)" % (self.budget, self.phase, self.used, unit, self.allowed, unit)
+
+class Watchdog(object):
+    """
+    Wall-clock and memory budgets of workflow phases, enforced on solver subprocesses.
+    
+    Budgets are given as a dict phase -> (seconds, MB), where 0 means no budget. Phases are nested with
+    Watchdog.watch and a thread checks every interval seconds the phases being watched. The memory used by a
+    phase is the current RSS of this process plus that of the running solver (read from /proc, so memory budgets
+    only apply on Linux). When a budget is exceeded, the running solver is killed and every solver call of the
+    phase raises BudgetExceeded until the phase ends. Solvers are objects with a process attribute holding
+    the Popen of their last call. Calls made by analysis pools (caspo analysis with threads) aren't killed.
+    """
+    
+    pagesize = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+    
+    def __init__(self, budgets, interval=0.5):
+        self.budgets = budgets
+        self.interval = interval
+        self.solvers = []
+        self.phases = []
+        self.exceeded = None
+        self.pid = None
+    
+    def start(self):
+        # threads don't survive forking (e.g., in pool workers), so each process starts its own one
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.lock = threading.Lock()
+            self.stopped = threading.Event()
+            thread = threading.Thread(target=self.loop)
+            thread.daemon = True
+            thread.start()
+            # python 2 may crash if a daemon thread wakes up while the interpreter is finalized
+            atexit.register(self.stop, thread)
+    
+    def stop(self, thread):
+        self.stopped.set()
+        thread.join()
+    
+    def loop(self):
+        while not self.stopped.wait(self.interval):
+            self.check()
+    
+    @contextmanager
+    def watch(self, phase):
+        """
+        Watches the budgets of phase (if any) until the end of the block
+        """
+        if not any(self.budgets.get(phase, (0, 0))):
+            yield
+            return
+        
+        self.start()
+        entry = (phase, time.time())
+        with self.lock:
+            self.phases.append(entry)
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.phases.remove(entry)
+                if self.exceeded and self.exceeded.phase == phase:
+                    self.exceeded = None
+    
+    def running(self):
+        for solver in self.solvers:
+            process = getattr(solver, 'process', None)
+            if process and process.poll() is None:
+                return process
+    
+    def rss(self, pid='self'):
+        """
+        Returns the current RSS in MB of the given process or 0 if it's unknown
+        """
+        try:
+            with open('/proc/%s/statm' % pid) as f:
+                return int(f.read().split()[1]) * self.pagesize / 1048576.
+        except (IOError, IndexError, ValueError):
+            return 0
+    
+    def check(self):
+        """
+        Kills the running solver if a budget of the phases being watched is exceeded
+        """
+        with self.lock:
+            if not self.phases:
+                return
+            
+            process = self.running()
+            memory = None
+            for phase, start in self.phases if not self.exceeded else []:
+                wall, mb = self.budgets[phase]
+                if wall and time.time() - start > wall:
+                    self.exceeded = BudgetExceeded(phase, 'wall', time.time() - start, wall)
+                    break
+                
+                if mb:
+                    if memory is None:
+                        memory = self.rss() + (self.rss(process.pid) if process else 0)
+                    
+                    if memory > mb:
+                        self.exceeded = BudgetExceeded(phase, 'memory', memory, mb)
+                        break
+            
+            # the solver may have been started after the budget was exceeded
+            if self.exceeded and process:
+                try:
+                    process.kill()
+                except OSError:
+                    pass
+    
+    def verify(self):
+        """
+        Raises BudgetExceeded if a budget of the phases being watched was exceeded
+        """
+        if self.exceeded:
+            raise self.exceeded
@@ -1,37 +1,242 @@
 import logging
 import gc
+import json
+import threading
+import hashlib
+import multiprocessing as mp
+import numpy as np
 from numpy import random
+from random import Random
 
 from zope import component
 from pyzcasp import potassco
-from caspo import core, learn, analyze, design
+from caspo import core, analyze, design
+
+from Simulator import Simulator
+from Evaluator import Evaluator
+from Learner import Learner
+from BehaviorCache import BehaviorCache
+from ResultCache import ResultCache
+from Enumerator import Enumerator, NetworkStore
+from Timings import Timings, TimedDB
+from StatsClingo import StatsClingo, WatchedClingo
+from Watchdog import Watchdog, BudgetExceeded
+
+# Workflow instance used by worker processes. It's set before forking the pool
+# so workers inherit it (together with the zope registry) instead of pickling it.
+_WORKFLOW = None
+
+def _init_worker():
+    random.seed()
+    _WORKFLOW.set_logfile('workflow-%s-%s.log' % (_WORKFLOW.db.name, mp.current_process().name), console=False)
+
+def _run_benchmark(args):
+    idmodel, resume = args
+    _WORKFLOW.run_benchmark(idmodel, resume)
+    return idmodel
+
+# Data shared by random runs (set before forking the pool, see Workflow.run_random)
+_RANDOM = None
+
+def _run_random(i):
+    return i, _WORKFLOW.random_run(i, *_RANDOM)
 
 class Workflow(object):
     
-    def __init__(self, db, pkn, land, dconf, mexps=80, lexps=False):
-        self.db = db
+    actions = {'skip': "skipping the tolerance step", 'relax': "relaxing the design", 'end': "ending the benchmark"}
+    
+    def __init__(self, db, pkn, land, dconf, mexps=80, lexps=False, tolerance='iterative', cache=100000, results=0, timings=None, seed=None, stream=0, spill=256, budgets=None):
+        solver = component.queryUtility(potassco.IClingo)
+        self.timings = Timings(db, timings, solver if isinstance(solver, StatsClingo) else None)
+        self.db = TimedDB(db, self.timings)
         self.pkn = pkn
         self.land = land
         self.dconf = dconf
         self.mexps = mexps
         self.lexps = lexps
+        self.tolerance = tolerance
+        self.seed = seed
+        self.idmodel = None
+        self.session = Learner(pkn, db.setup, land, potassco.IClingo, "round", 100)
+        self.cache = BehaviorCache(cache) if cache > 0 else None
+        # workers share the result cache of the main DB rather than having one per shard
+        self.results = ResultCache('results-%s' % (self.db.source or self.db.name), results, journal_mode=self.db.journal_mode) if results > 0 else None
+        self.enumerator = Enumerator(db, stream, spill) if stream > 0 else None
+        self.watchdog = Watchdog(budgets or {})
+        for watched in [solver, self.enumerator]:
+            if isinstance(watched, (WatchedClingo, Enumerator)):
+                watched.watchdog = self.watchdog
+                self.watchdog.solvers.append(watched)
+        self.inputs = [db.get_pkn(), land, [db.setup.stimuli, db.setup.inhibitors, db.setup.readouts]]
         
         self.logger = logging.getLogger("workflow-%s" % self.db.name)
         self.logger.setLevel(logging.INFO)
+        self.handlers = []
         
-        fh = logging.FileHandler('workflow-%s.log' % self.db.name, 'w')
+        self.set_logfile('workflow-%s.log' % self.db.name)
+        
+    def set_logfile(self, filename, console=True):
+        for handler in self.handlers:
+            self.logger.removeHandler(handler)
+            handler.close()
+        
+        fh = logging.FileHandler(filename, 'w')
         fh.setLevel(logging.INFO)
-        self.logger.addHandler(fh)
+        self.handlers = [fh]
+        
+        if console:
+            ch = logging.StreamHandler()
+            ch.setLevel(logging.INFO)
+            self.handlers.append(ch)
+            
+        for handler in self.handlers:
+            self.logger.addHandler(handler)
+    
+    def checkpoint(self, phase, compute, dump, load):
+        """
+        Result of a phase of the current benchmark iteration. If an interrupted execution completed the phase,
+        its result is restored from the checkpoint stored in the DB (see DB.insert_checkpoint). Otherwise, it's
+        computed and stored. Phases of random runs aren't checkpointed.
+        """
+        if self.idmodel is None:
+            return compute()
+        
+        # results are wrapped so that phases without results (e.g. no designs) are restored as well
+        value = self.db.get_checkpoint(self.idmodel, self.it, phase)
+        if value is not None:
+            self.logger.info("\tRestoring %s from checkpoint" % phase)
+            return load(value['result'])
+        
+        result = compute()
+        self.db.insert_checkpoint(self.idmodel, self.it, phase, {'result': dump(result)})
+        return result
+        
+    def save_random(self, idmodel, it):
+        """
+        Stores the state of the seeded random generator as a checkpoint of iteration it, so that a benchmark
+        resumed from that iteration makes the same random choices as an uninterrupted one
+        """
+        name, keys, pos, has_gauss, cached = random.get_state()
+        self.db.insert_checkpoint(idmodel, it, 'random', {'state': [name, keys.tolist(), pos, has_gauss, cached]})
+        
+    def restore_random(self, idmodel, it):
+        """
+        Restores the state of the random generator stored for iteration it (see Workflow.save_random), if any
+        """
+        value = self.db.get_checkpoint(idmodel, it, 'random')
+        if value is not None:
+            name, keys, pos, has_gauss, cached = value['state']
+            random.set_state((str(name), np.array(keys, dtype=np.uint32), pos, has_gauss, cached))
+        
+    def learn(self, learner, data, fit, size):
+        """
+        Networks learned with the given tolerance, reusing the results of previous executions if enabled.
+        If streaming is enabled, networks are enumerated into a NetworkStore with bounded memory (see Enumerator)
+        and neither checkpoints nor caches are used.
+        """
+        def compute():
+            if self.results is None:
+                return learner.learn(fit, size)
+            
+            return self.results.learn(learner, [self.inputs, ResultCache.dump_dataset(data)], fit, size)
+            
+        def load(value):
+            Learner.restore_optimum(learner, value['optimal'])
+            
+            return core.BooleLogicNetworkSet(map(ResultCache.load_network, value['networks']), update_names=False)
+            
+        with self.watchdog.watch('learn'), self.timings.phase('learn') as counts:
+            if self.enumerator is not None:
+                networks = self.enumerator.learn(learner, fit, size)
+            else:
+                networks = self.checkpoint('learn %s %s' % (fit, size), compute, 
+                                           lambda networks: {'optimal': Learner.optimum(learner), 'networks': map(ResultCache.dump_network, networks)}, load)
+            
+            counts['networks'] = len(networks)
+            
+        return networks
+        
+    def behaviors(self, networks, dataset):
+        """
+        Input-output behaviors of the networks, reusing the results of previous executions if enabled.
+        Checkpoints are identified by the hash of the networks, stored as in the result cache.
+        Networks in a NetworkStore are analyzed in chunks (see Enumerator) without checkpoints nor caches.
+        """
+        def compute():
+            if self.results is None:
+                return self.analyze(networks, dataset)
+            
+            return self.results.behaviors(self.analyze, networks, dataset, self.inputs)
+            
+        with self.watchdog.watch('analyze'), self.timings.phase('analyze') as counts:
+            if isinstance(networks, NetworkStore):
+                behaviors = self.enumerator.behaviors(networks, dataset)
+            elif self.idmodel is None:
+                behaviors = compute()
+            else:
+                dumps, ordered = ResultCache.sort_networks(networks)
+                behaviors = self.checkpoint('analyze %s' % hashlib.sha1(json.dumps(dumps)).hexdigest(), compute, 
+                                            lambda behaviors: ResultCache.dump_behaviors(dumps, behaviors), 
+                                            lambda groups: ResultCache.load_behaviors(ordered, dataset, groups))
+            
+            counts['networks'] = len(networks)
+            counts['behaviors'] = len(behaviors)
+            
+        return behaviors
+        
+    def tolerate(self, learner, data, dataset, fit, size):
+        """
+        Networks learned with the given tolerance and their input-output behaviors
+        """
+        networks = self.learn(learner, data, fit, size)
+        if isinstance(networks, NetworkStore):
+            self.logger.info("\tAnalyzing %s networks in chunks of %s" % (len(networks), self.enumerator.chunk))
+        else:
+            self.logger.info("\tAnalyzing %s networks" % len(networks))
         
-        ch = logging.StreamHandler()
-        ch.setLevel(logging.INFO)
-        self.logger.addHandler(ch)
+        return networks, self.behaviors(networks, dataset)
+        
+    def analyze(self, networks, dataset):
+        """
+        Input-output behaviors of the networks, reusing the behaviors found previously if the cache is enabled
+        """
+        if self.cache is None:
+            return analyze.behaviors(networks, dataset, potassco.IClingo)
+            
+        return self.cache.behaviors(networks, dataset)
+    
+    def design(self, designer, behaviors, **kwargs):
+        """
+        Optimal experimental designs for the behaviors, reusing the results of previous executions if enabled
+        """
+        def compute():
+            if self.results is None:
+                return designer.design(**kwargs)
+            
+            clampings = map(ResultCache.dump_clamping, self.lexps.clampings) if self.lexps else None
+            return self.results.design(designer, [self.inputs, clampings], behaviors, **kwargs)
+            
+        with self.watchdog.watch('design'), self.timings.phase('design') as counts:
+            counts['behaviors'] = len(behaviors)
+            return self.checkpoint('design %s' % kwargs.get('relax', 0), compute, ResultCache.dump_designs, ResultCache.load_designs)
+    
+    def over_budget(self, exceeded, action, idmodel, it, run=None):
+        """
+        Logs and stores a budget exceeded (see Watchdog) together with the action taken: skip the tolerance step,
+        relax the design or end the benchmark (or random run)
+        """
+        self.logger.info("\t%s: %s" % (exceeded, self.actions[action]))
+        self.db.insert_budget(idmodel, it, run, exceeded, action)
+        gc.collect()
     
     def perform_experiments(self, idmodel, data, exps):
+        # the order of optimal designs given by the solver may change between runs
+        exps.sort(key=lambda e: sorted(sorted(c) for c in e.clampings))
         random.shuffle(exps)
+        news = self.db.check_designs(idmodel, [e.clampings for e in exps])
         while exps:
             optdesign = exps.pop()
-            nexps = self.db.check_clampings(idmodel, optdesign.clampings)
+            nexps = news.pop()
             ne = len(nexps)
             if ne > 0:
                 if ne + data.nexps <= self.mexps:
@@ -46,141 +251,349 @@ class Workflow(object):
                 self.logger.info("\tAll optimal experimental designs were performed already")
                 return True
                 
-    def run(self, nb=1, resume=False):
-        last = -1
-        for idmodel in range(nb):
-            if resume:
-                last = self.db.get_last_it(idmodel)
-                self.it = last - 1
+    def pool(self, jobs):
+        """
+        Returns a pool of jobs processes running this workflow. Connections are closed before forking
+        so that each process opens its own ones.
+        """
+        global _WORKFLOW
+        _WORKFLOW = self
+        
+        self.db.close()
+        if self.results:
+            self.results.close()
+            
+        return mp.Pool(processes=jobs, initializer=_init_worker)
+        
+    def run(self, nb=1, resume=False, jobs=1):
+        """
+        Run nb benchmarks, using a pool of jobs processes if jobs > 1
+        """
+        if jobs > 1:
+            pool = self.pool(jobs)
+            try:
+                for idmodel in pool.imap_unordered(_run_benchmark, [(idmodel, resume) for idmodel in range(nb)]):
+                    self.logger.info("Benchmark %s finished" % idmodel)
+                pool.close()
+            except:
+                pool.terminate()
+                raise
+            finally:
+                pool.join()
+        else:
+            for idmodel in range(nb):
+                self.run_benchmark(idmodel, resume)
+            
+    def run_queue(self, queue, worker, lease=600, attempts=3):
+        """
+        Runs benchmarks claimed from the queue in the DB queue (see DB.claim_benchmark) as the given worker until
+        none is left. Results are written to this workflow DB (the shard of the worker). While a benchmark runs,
+        a thread renews its lease every third of lease seconds, so that only benchmarks of crashed workers are
+        claimed again by others. Benchmarks are run with resume, so those interrupted in this shard are resumed.
+        A benchmark raising an error is logged and queued again, until it has been claimed attempts times and
+        it's marked as failed, and the worker goes on with the next one.
+        """
+        while True:
+            idmodel = queue.claim_benchmark(worker, lease, attempts)
+            if idmodel is None:
+                self.logger.info("No benchmarks left in the queue")
+                break
+            
+            stop = threading.Event()
+            def heartbeat():
+                while not stop.wait(lease / 3.):
+                    if not queue.heartbeat(idmodel, worker):
+                        self.logger.info("Benchmark %s was claimed by another worker" % idmodel)
+                        
+            thread = threading.Thread(target=heartbeat)
+            thread.daemon = True
+            thread.start()
+            finished = False
+            try:
+                self.run_benchmark(idmodel, True)
+                finished = True
+            except Exception:
+                self.logger.exception("Benchmark %s failed" % idmodel)
+            finally:
+                stop.set()
+                thread.join()
+                if not finished:
+                    queue.release_benchmark(idmodel, worker, attempts)
+                
+            if not finished:
+                continue
+                
+            if queue.finish_benchmark(idmodel, worker):
+                self.logger.info("Benchmark %s finished" % idmodel)
             else:
-                self.it = -1
-                self.db.init(idmodel)
+                self.logger.info("Benchmark %s finished but it was claimed by another worker" % idmodel)
+            
+    def run_benchmark(self, idmodel, resume=False):
+        last = None
+        if resume:
+            if self.db.is_done(idmodel):
+                self.logger.info("Benchmark %s already finished" % idmodel)
+                return
                 
-            self.logger.info("Benchmark %s" % idmodel)
-            all_data = self.db.get_all_dataset(idmodel)
+            last = self.db.get_last_it(idmodel)
+            
+        if last is None:
+            self.it = -1
+            self.db.init(idmodel)
+        else:
+            self.it = last - 1
+            self.db.reset_iteration(idmodel, last)
+            
+        self.logger.info("Benchmark %s" % idmodel)
+        self.idmodel = idmodel
+        if self.seed is not None:
+            random.seed(self.seed + idmodel)
+            if last is not None:
+                self.restore_random(idmodel, last)
+            
+        all_data = self.db.get_all_dataset(idmodel)
         
-            done = False
-            while not done:
-                self.it += 1
-                self.logger.info("Iteration %s" % self.it)
-                data = self.db.get_benchmarking_data(idmodel)
+        done = False
+        while not done:
+            self.it += 1
+            self.logger.info("Iteration %s" % self.it)
+            data = self.db.get_benchmarking_data(idmodel)
 
-                fit = 0
-                size = 0
-                self.logger.info("\tLearning without tolerance")
-                learner = learn.learner(self.pkn, data, 1, self.land, potassco.IClingo, "round", 100)
-                networks = learner.learn(fit,size)
-                self.logger.info("\tAnalyzing %s networks" % len(networks))
-                behaviors =  analyze.behaviors(networks, all_data, potassco.IClingo)
+            fit = 0
+            size = 0
+            self.logger.info("\tLearning without tolerance")
+            learner = self.session.learner(data, 1)
+            try:
+                networks, behaviors = self.tolerate(learner, data, all_data, fit, size)
+            except BudgetExceeded as e:
+                self.over_budget(e, 'end', idmodel, self.it)
+                break
 
-                learning = behaviors.mse(data, 1)
-                testing = behaviors.mse(all_data, 1)
+            with self.timings.phase('mse'):
+                # clampings simulated for all data are reused for the learning data
+                evaluator = Evaluator(behaviors, all_data.setup)
+                testing = evaluator.mse(all_data, 1)
+                learning = evaluator.mse(data, 1)
                 
-                if last < self.it:
-                    self.db.insert_mse(idmodel, self.it, learning, testing)
+            self.db.insert_mse(idmodel, self.it, learning, testing)
 
+            with self.watchdog.watch('tolerance'):
                 if len(behaviors) == 1:
-                    while len(behaviors) == 1 and size < 5:
-                        try:
-                            size += 1
-                            self.logger.info("\tLearning with %s size tolerance" % size)
-                            networks = learner.learn(0, size)
-                            self.logger.info("\tAnalyzing %s networks" % len(networks))    
-                            behaviors =  analyze.behaviors(networks, all_data, potassco.IClingo)
-                        except OSError as e:
-                            self.logger.info("\t%s" % str(e))
-                            networks = None
-                            gc.collect()
-                            break
-
-                    if len(behaviors) == 1:
-                        size = 0
-                        while len(behaviors) == 1 and fit < 0.05:
-                            try:
-                                fit += 0.01
-                                self.logger.info("\tLearning with %s fitness tolerance" % fit)
-                                networks = learner.learn(fit, 0)
-                                self.logger.info("\tAnalyzing %s networks" % len(networks))
-                                behaviors =  analyze.behaviors(networks, all_data, potassco.IClingo)
-                            except OSError as e:
-                                self.logger.info("\t%s" % str(e))
-                                networks = None
-                                gc.collect()
-                                break
-            
-                if len(behaviors) > 1:
+                    search = self.search_tolerance if self.tolerance == 'single' else self.iterate_tolerance
+                    fit, size, networks, behaviors = search(learner, data, all_data, networks, behaviors)
+        
+            if networks:
+                self.db.insert_networks(idmodel, self.it, networks)
+                
+            if len(behaviors) > 1:
+                try:
+                    self.db.insert_behaviors(idmodel, self.it, fit, size, len(networks), len(behaviors))
+        
+                    designer = design.designer(behaviors, all_data.setup, self.lexps, potassco.IClingo)
+                    self.logger.info("\tDiscriminating %s behaviors" % len(behaviors))                            
                     try:
-                        self.db.insert_behaviors(idmodel, self.it, fit, size, len(networks), len(behaviors))
-            
-                        designer = design.designer(behaviors, all_data.setup, self.lexps, potassco.IClingo)
-                        self.logger.info("\tDiscriminating %s behaviors" % len(behaviors))                            
-                        exps = designer.design(**self.dconf)
-            
+                        exps = self.design(designer, behaviors, **self.dconf)
+                    except BudgetExceeded as e:
+                        self.over_budget(e, 'relax', idmodel, self.it)
+                        exps = None
+                        relaxed = True
+                    else:
+                        relaxed = False
+        
+                    if exps:
+                        self.logger.info("\t%s optimal experimental design(s)" % len(exps))
+                        done = self.perform_experiments(idmodel, data, exps)
+                    else:
+                        if not relaxed:
+                            self.logger.info("\tCannot discriminate all behaviors pairwise")
+                            
+                        exps = self.design(designer, behaviors, relax=1, **self.dconf)
                         if exps:
                             self.logger.info("\t%s optimal experimental design(s)" % len(exps))
                             done = self.perform_experiments(idmodel, data, exps)
                         else:
-                            self.logger.info("\tCannot discriminate all behaviors pairwise")
-                            exps = designer.design(relax=1, **self.dconf)
-                            if exps:
-                                self.logger.info("\t%s optimal experimental design(s)" % len(exps))
-                                done = self.perform_experiments(idmodel, data, exps)
-                            else:
-                                self.logger.info("\tCannot generate any difference among given behaviors")
-                                done = True
-                    except OSError as e:
-                        self.logger.info("\t%s" % str(e))
-                        networks = None
-                        behaviors = None
-                        gc.collect()
-                        done = True
-                else:
+                            self.logger.info("\tCannot generate any difference among given behaviors")
+                            done = True
+                except BudgetExceeded as e:
+                    self.over_budget(e, 'end', idmodel, self.it)
                     done = True
-            
-            self.db.insert_last_it(idmodel, self.it)
-            
-    def run_random(self, n, idmodel, step):
-        all_data = self.db.get_all_dataset(idmodel)
+                except OSError as e:
+                    self.logger.info("\t%s" % str(e))
+                    networks = None
+                    behaviors = None
+                    gc.collect()
+                    done = True
+            else:
+                done = True
+                
+            if not done:
+                if self.seed is not None:
+                    self.save_random(idmodel, self.it + 1)
+                    
+                self.db.insert_last_it(idmodel, self.it + 1)
+                self.timings.flush(idmodel, self.it)
         
-        runs_mse = []
-        runs_io = []
-        for i in xrange(n):
-            self.logger.info("Random run %s" % i)
+        self.db.insert_last_it(idmodel, self.it, True)
+        self.timings.flush(idmodel, self.it)
+        self.idmodel = None
             
-            dataset = self.db.get_benchmarking_data(idmodel, it=0)        
-            rand_dataset = self.db.get_random_dataset(idmodel, self.mexps - dataset.nexps, **self.dconf)
+    def iterate_tolerance(self, learner, data, all_data, networks, behaviors):
+        """
+        Tolerance search learning again for each step: increasing size tolerance up to 5 and then fitness tolerance
+        up to 0.05, until more than one behavior is found. Returns the fitness and size tolerance together with the
+        networks and behaviors of the last step (no networks if it failed).
+        """
+        fit = 0
+        size = 0
+        while len(behaviors) == 1 and size < 5:
+            try:
+                size += 1
+                self.logger.info("\tLearning with %s size tolerance" % size)
+                networks, behaviors = self.tolerate(learner, data, all_data, 0, size)
+            except BudgetExceeded as e:
+                self.over_budget(e, 'skip', self.idmodel, self.it)
+                networks = None
+                break
+            except OSError as e:
+                self.logger.info("\t%s" % str(e))
+                networks = None
+                gc.collect()
+                break
 
-            mse = {}
-            io = {}
-            err = False
-            while dataset.nexps < self.mexps:
+        # a tolerance search over budget stops with the first kind of tolerance
+        if len(behaviors) == 1 and not self.watchdog.exceeded:
+            size = 0
+            while len(behaviors) == 1 and fit < 0.05:
                 try:
-                    sample = min(step, self.mexps - dataset.nexps)
-                    dataset.add(rand_dataset.pop_sample(sample))
-    
-                    self.logger.info("\tLearning without tolerance using %s experiments" % dataset.nexps)
-                    learner = learn.learner(self.pkn, dataset, 1, self.land, potassco.IClingo, "round", 100)
-                    networks = learner.learn(0,0)
-                
-                    self.logger.info("\tAnalyzing %s networks" % len(networks))
-                    behaviors =  analyze.behaviors(networks, all_data, potassco.IClingo)
-
-                    mse[dataset.nexps] = behaviors.mse(all_data, 1)
-                    io[dataset.nexps] = len(behaviors)
-                    self.logger.info("\tTesting MSE equals %s - %s behaviors" % (mse[dataset.nexps],io[dataset.nexps]))
-                    
+                    fit += 0.01
+                    self.logger.info("\tLearning with %s fitness tolerance" % fit)
+                    networks, behaviors = self.tolerate(learner, data, all_data, fit, 0)
+                except BudgetExceeded as e:
+                    self.over_budget(e, 'skip', self.idmodel, self.it)
+                    networks = None
+                    break
                 except OSError as e:
                     self.logger.info("\t%s" % str(e))
-                    err = True
                     networks = None
-                    behaviors = None
                     gc.collect()
                     break
+        
+        return fit, size, networks, behaviors
+        
+    def search_tolerance(self, learner, data, all_data, networks, behaviors):
+        """
+        Tolerance search following the same steps of the iterative search (increasing size tolerance up to 5 and
+        then fitness tolerance up to 0.05) but enumerating networks only once per kind of tolerance. Networks are
+        learned with the widest tolerance of each kind and filtered in-process by residual and size.
+        Returns the fitness and size tolerance together with the networks and behaviors found. If no tolerance
+        gives more than one behavior, returns the networks learned with 0.05 fitness tolerance as the iterative
+        search does, or no networks if the last kind of tolerance failed.
+        """
+        discretize = component.createObject("round", 100)
+        clampings, observations = Simulator.observations(data, 1, data.setup.readouts)
+        observed = ~np.isnan(observations)
+        observations[observed] = map(discretize, observations[observed])
+        
+        opt_rss, opt_size = Learner.optimum(learner)
+        steps = [(0, 5, [(0, size) for size in xrange(1, 6)]), 
+                 (0.05, 0, [(fit, 0) for fit in (0.01, 0.02, 0.03, 0.04, 0.05)])]
+                 
+        failed = False
+        tolerated = networks
+        for wfit, wsize, tolerances in steps:
+            # as in the iterative search, a failure skips one kind of tolerance but a tolerance budget ends the search
+            if self.watchdog.exceeded:
+                break
+                
+            try:
+                self.logger.info("\tLearning with %s fitness and %s size tolerance" % (wfit, wsize))
+                scores = []
+                wide = self.learn(learner, data, wfit, wsize)
+                with self.timings.phase('filter'):
+                    # streamed networks are decoded in chunks, so they're kept as positions in the store
+                    if not isinstance(wide, NetworkStore):
+                        wide = list(wide)
+                    
+                    for i, network in enumerate(wide):
+                        simulator = Simulator(network, data.setup.readouts)
+                        scores.append((i, simulator.rss(clampings, observations, discretize.factor), simulator.size))
+                
+                def tolerate(fit, size):
+                    trss = int(opt_rss + opt_rss * fit)
+                    subset = [i for i, rss, sz in scores if rss <= trss and sz <= opt_size + size]
+                    if isinstance(wide, NetworkStore):
+                        return wide.subset(subset)
+                    
+                    return core.BooleLogicNetworkSet([wide[i] for i in subset], update_names=False)
+                    
+                last = len(networks)
+                for fit, size in tolerances:
+                    tnetworks = tolerate(fit, size)
+                    
+                    # tolerances are increasing so the same number of networks means the same networks
+                    if len(tnetworks) == last:
+                        continue
+                        
+                    last = len(tnetworks)
+                    self.logger.info("\tAnalyzing %s networks with %s fitness and %s size tolerance" % (len(tnetworks), fit, size))
+                    tbehaviors = self.behaviors(tnetworks, all_data)
+                    if len(tbehaviors) > 1:
+                        return fit, size, tnetworks, tbehaviors
+                        
+                # without a split, the iterative search ends holding the networks of the widest tolerance
+                tolerated = tolerate(wfit, wsize)
+                
+            except BudgetExceeded as e:
+                self.over_budget(e, 'skip', self.idmodel, self.it)
+                failed = True
             
-            if not err:
-                runs_mse.append(mse)
-                runs_io.append(io)
+            except OSError as e:
+                self.logger.info("\t%s" % str(e))
+                gc.collect()
+                failed = True
+                
+            else:
+                failed = False
+                
+        if failed:
+            return 0, 0, None, behaviors
+        
+        return 0.05, 0, tolerated, behaviors
+        
+    def run_random(self, n, idmodel, step, seed=None, jobs=1):
+        """
+        If a seed is given, the i-th random run uses the seed+i so that each run can be reproduced on its own.
+        Runs are independent from each other, so they can be run in a pool of jobs processes. The dataset,
+        the initial experiments and the population of random experiments are loaded once and shared by all runs.
+        """
+        all_data = self.db.get_all_dataset(idmodel)
+        initial = self.db.get_benchmarking_rows(idmodel, it=0)
+        population = self.db.get_population_rows(idmodel, **self.dconf)
+        args = (idmodel, step, seed, all_data, initial, population)
         
+        runs = {}
+        if jobs > 1:
+            global _RANDOM
+            _RANDOM = args
+            
+            pool = self.pool(jobs)
+            try:
+                for i, run in pool.imap_unordered(_run_random, range(n)):
+                    self.logger.info("Random run %s finished" % i)
+                    runs[i] = run
+                pool.close()
+            except:
+                pool.terminate()
+                raise
+            finally:
+                pool.join()
+                _RANDOM = None
+        else:
+            for i in xrange(n):
+                runs[i] = self.random_run(i, *args)
+
+        runs_mse = [runs[i][0] for i in sorted(runs) if runs[i]]
+        runs_io = [runs[i][1] for i in sorted(runs) if runs[i]]
         if runs_mse and runs_io:
             writer = component.getUtility(core.ICsvWriter)
             writer.load(runs_mse, runs_mse[0].keys())
@@ -188,3 +601,46 @@ class Workflow(object):
         
             writer.load(runs_io, runs_io[0].keys())
             writer.write("behaviors-random-%s-%s-%s.csv" % (self.db.name, idmodel, n), ".")
+
+    def random_run(self, i, idmodel, step, seed, all_data, initial, population):
+        """
+        Runs the i-th random run and returns the MSE and number of behaviors for each number of experiments,
+        or None if the run failed
+        """
+        self.logger.info("Random run %s" % i)
+        rng = Random(seed + i if seed is not None else None)
+        
+        dataset = self.db.dataset_class.from_db_rows(initial, self.db.setup)
+        rand_dataset = self.db.get_random_dataset(idmodel, self.mexps - dataset.nexps, rng=rng, rows=population)
+        rand_dataset.rng = rng
+        
+        mse = {}
+        io = {}
+        while dataset.nexps < self.mexps:
+            try:
+                sample = min(step, self.mexps - dataset.nexps)
+                dataset.add(rand_dataset.pop_sample(sample))
+                
+                self.logger.info("\tLearning without tolerance using %s experiments" % dataset.nexps)
+                learner = self.session.learner(dataset, 1)
+                networks, behaviors = self.tolerate(learner, dataset, all_data, 0, 0)
+                
+                with self.timings.phase('mse'):
+                    mse[dataset.nexps] = Evaluator(behaviors, all_data.setup).mse(all_data, 1)
+                    
+                io[dataset.nexps] = len(behaviors)
+                self.logger.info("\tTesting MSE equals %s - %s behaviors" % (mse[dataset.nexps],io[dataset.nexps]))
+                
+            except BudgetExceeded as e:
+                self.over_budget(e, 'end', idmodel, dataset.nexps, i)
+                return None
+                
+            except OSError as e:
+                self.logger.info("\t%s" % str(e))
+                gc.collect()
+                return None
+                
+            finally:
+                self.timings.flush(idmodel, dataset.nexps, i)
+        
+        return mse, io
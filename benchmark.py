@@ -0,0 +1,207 @@
+##
+# Performance benchmark of sbloopy itself over the bundled datasets.
+# Each case runs sbloopy.py with a fixed seed in a fresh working directory and the time and memory of each phase
+# are read from the tables benchmark_timings, benchmark_solver and benchmark_mse of the resulting database.
+# Scaling cases run over synthetic PKNs and setups of increasing size written by Generator in the working directory.
+##
+
+import os, sys, json, time, shlex, shutil, argparse, platform, tempfile, subprocess
+import sqlite3 as lite
+from collections import OrderedDict
+
+from Generator import Generator
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# name -> (sbloopy arguments with paths relative to ROOT, database name, size of the synthetic PKN and setup or None)
+CASES = OrderedDict([
+    ('insilico', (['insilico', 'data/insilico/pkn.sif', 'data/insilico/dataset.csv', '28', '32', '2', '4',
+                   '--max-stimuli', '3', '--max-inhibitors', '2', '--total-exps', '72', '--max-exps', '3'], 'insilico', None)),
+    ('real',     (['real', 'data/real/subset.sif', 'data/real/data_norm_midas_screening.csv', '1',
+                   'data/real/data_norm_midas_followup.csv', '1'], 'real', None)),
+])
+
+# scaling cases: nodes, stimuli, inhibitors and readouts
+for nodes in (50, 100, 200, 400):
+    CASES['scale-%s' % nodes] = (['insilico', 'pkn.sif', 'setup.csv', '28', '32', '2', '4', '--max-stimuli', '2', '--max-inhibitors', '1',
+                                  '--total-exps', '46', '--max-exps', '3'], 'insilico', (nodes, 5, 5, nodes // 10))
+
+def resolve(args):
+    return [os.path.join(ROOT, arg) if arg.startswith('data/') else arg for arg in args]
+
+def collect(filename):
+    """
+    Returns the measures stored by a sbloopy run in the given database
+    """
+    con = lite.connect(filename)
+    con.row_factory = lite.Row
+    
+    with con:
+        cur = con.cursor()
+        cur.execute("SELECT phase, SUM(calls) AS calls, SUM(wall) AS wall, SUM(cpu) AS cpu, SUM(solver) AS solver \
+            FROM benchmark_timings GROUP BY phase ORDER BY phase")
+        phases = OrderedDict((row['phase'], dict(row)) for row in cur.fetchall())
+        for phase in phases.itervalues():
+            del phase['phase']
+        
+        cur.execute("SELECT MAX(rss), MAX(solver_rss) FROM benchmark_timings")
+        rss, solver_rss = cur.fetchone()
+        
+        cur.execute("SELECT SUM(calls) AS calls, SUM(ground) AS ground, SUM(solve) AS solve, SUM(choices) AS choices, \
+            SUM(conflicts) AS conflicts, SUM(models) AS models FROM benchmark_solver")
+        solver = dict(cur.fetchone())
+        
+        cur.execute("SELECT idmodel, it, training, testing FROM benchmark_mse ORDER BY idmodel, it")
+        mse = map(list, cur.fetchall())
+    
+    con.close()
+    return {'iterations': len(mse), 'peak_rss': rss, 'peak_solver_rss': solver_rss, 'phases': phases, 'solver': solver, 'mse': mse}
+
+def run_case(name, seed, clingo, extra, workdir):
+    """
+    Runs sbloopy for the case in workdir and returns its measures
+    """
+    args, db, size = CASES[name]
+    if size:
+        generator = Generator(*size, seed=seed)
+        generator.write_sif(os.path.join(workdir, 'pkn.sif'))
+        generator.write_midas(os.path.join(workdir, 'setup.csv'))
+    
+    cmd = [sys.executable, os.path.join(ROOT, 'sbloopy.py')] + resolve(args) + \
+          ['--clingo', clingo, '--seed', str(seed), '--result-cache', '0', '--timings', 'timings.jsonl'] + extra
+    
+    with open(os.path.join(workdir, 'sbloopy.out'), 'w') as out:
+        start = time.time()
+        code = subprocess.call(cmd, cwd=workdir, stdout=out, stderr=subprocess.STDOUT)
+        wall = time.time() - start
+    
+    result = {'command': cmd, 'returncode': code, 'wall': wall}
+    if size:
+        result['size'] = {'nodes': size[0], 'edges': len(generator.edges), 'stimuli': size[1], 'inhibitors': size[2], 'readouts': size[3]}
+    
+    if code == 0:
+        result.update(collect(os.path.join(workdir, db)))
+        result['iterations_per_second'] = result['iterations'] / wall if wall else 0
+    
+    return result
+
+def run(cases, seed=0, repeat=1, clingo='clingo', extra=[], workdir=None):
+    """
+    Runs each case repeat times and keeps the run with the median wall time
+    """
+    results = OrderedDict()
+    for name in cases:
+        runs = []
+        for i in xrange(repeat):
+            path = tempfile.mkdtemp(prefix='%s-%s-' % (name, i), dir=workdir)
+            try:
+                runs.append(run_case(name, seed, clingo, extra, path))
+            finally:
+                if workdir is None:
+                    shutil.rmtree(path)
+            
+            sys.stderr.write("%s run %s: %.1fs (return code %s)\n" % (name, i, runs[-1]['wall'], runs[-1]['returncode']))
+        
+        runs.sort(key=lambda r: r['wall'])
+        results[name] = runs[len(runs) // 2]
+        results[name]['walls'] = [r['wall'] for r in runs]
+    
+    return results
+
+def compare(results, baseline, tolerance=0.2, threshold=1.0):
+    """
+    Compares the wall time of each case and phase with the baseline. Times increasing more than the tolerance
+    (relative) and the threshold (in seconds) are regressions. It also tells whether each case gives the same
+    MSE along the iterations.
+    """
+    comparison = OrderedDict()
+    for name, result in results.iteritems():
+        base = baseline.get('cases', {}).get(name)
+        if not base or base.get('returncode') or result.get('returncode'):
+            continue
+        
+        entries = [('total', result['wall'], base['wall'])]
+        for phase, measures in result['phases'].iteritems():
+            if phase in base['phases']:
+                entries.append((phase, measures['wall'], base['phases'][phase]['wall']))
+        
+        rows = OrderedDict()
+        for entry, wall, bwall in entries:
+            rows[entry] = {'wall': wall, 'baseline': bwall, 'ratio': wall / bwall if bwall else None,
+                           'regression': wall > bwall * (1 + tolerance) and wall - bwall > threshold}
+        
+        comparison[name] = {'same_results': result['mse'] == base['mse'], 'walls': rows,
+                            'regression': any(row['regression'] for row in rows.itervalues())}
+    
+    return comparison
+
+def report(results, comparison):
+    for name, result in results.iteritems():
+        if result['returncode']:
+            sys.stderr.write("%s failed with return code %s\n" % (name, result['returncode']))
+            continue
+        
+        sys.stderr.write("%s: %.1fs, %s iterations (%.3f it/s), peak RSS %s KB (solver %s KB)\n" %
+            (name, result['wall'], result['iterations'], result['iterations_per_second'], result['peak_rss'], result['peak_solver_rss']))
+        
+        rows = comparison.get(name, {}).get('walls', {})
+        for phase, measures in result['phases'].iteritems():
+            line = "\t%-8s %8.2fs wall %8.2fs cpu %8.2fs solver %6s calls" % (phase, measures['wall'], measures['cpu'], measures['solver'], measures['calls'])
+            if phase in rows and rows[phase]['ratio']:
+                line += "  x%.2f%s" % (rows[phase]['ratio'], " REGRESSION" if rows[phase]['regression'] else "")
+            
+            sys.stderr.write(line + "\n")
+        
+        if name in comparison:
+            total = comparison[name]['walls']['total']
+            sys.stderr.write("\ttotal x%.2f of baseline%s, %s results\n" %
+                (total['ratio'], " REGRESSION" if total['regression'] else "", "same" if comparison[name]['same_results'] else "different"))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser("benchmark", description="Performance benchmark of sbloopy over the bundled datasets")
+    parser.add_argument("cases", nargs="*", metavar="case", 
+                        help="cases to run among %s, or scaling for all scale-N cases (Default to insilico and real)" % ", ".join(CASES))
+    parser.add_argument("--clingo", dest="clingo", default="clingo", help="clingo solver binary (Default to 'clingo')", metavar="C")
+    parser.add_argument("--seed", type=int, default=0, metavar="S", help="seed for sbloopy runs (Default to 0)")
+    parser.add_argument("--repeat", type=int, default=1, metavar="R", help="runs per case, the median one is reported (Default to 1)")
+    parser.add_argument("--sbloopy-args", dest="extra", default="", metavar="A", help="extra arguments for sbloopy, e.g., '--columnar --threads 4'")
+    parser.add_argument("--workdir", metavar="D", help="keep the working directory of each run in D (Default to temporary directories)")
+    parser.add_argument("--output", metavar="F", help="write the results as JSON to F (Default to standard output)")
+    parser.add_argument("--baseline", metavar="F", help="compare with the results in F written by a previous execution")
+    parser.add_argument("--tolerance", type=float, default=0.2, metavar="T", help="relative increase of wall time considered a regression (Default to 0.2)")
+    parser.add_argument("--threshold", type=float, default=1.0, metavar="S", help="min increase in seconds considered a regression (Default to 1)")
+    
+    args = parser.parse_args()
+    cases = []
+    for case in args.cases or ['insilico', 'real']:
+        if case == 'scaling':
+            cases.extend(name for name in CASES if CASES[name][2])
+        elif case in CASES:
+            cases.append(case)
+        else:
+            parser.error("unknown case %s" % case)
+    
+    results = run(cases, args.seed, args.repeat, args.clingo, shlex.split(args.extra), args.workdir)
+    
+    comparison = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            comparison = compare(results, json.load(f), args.tolerance, args.threshold)
+    
+    report(results, comparison)
+    
+    output = OrderedDict([('seed', args.seed), ('repeat', args.repeat), ('sbloopy_args', args.extra),
+                          ('python', platform.python_version()), ('platform', platform.platform()),
+                          ('clingo', subprocess.check_output([args.clingo, '--version']).splitlines()[0]),
+                          ('cases', results)])
+    if comparison:
+        output['comparison'] = comparison
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2)
+    else:
+        json.dump(output, sys.stdout, indent=2)
+    
+    if any(c['regression'] for c in comparison.itervalues()) or any(r['returncode'] for r in results.itervalues()):
+        sys.exit(1)
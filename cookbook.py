@@ -7,6 +7,7 @@ from zope import component
 from caspo import core
 
 from DB import iDB
+from Simulator import Simulator
 
 READER = component.getUtility(core.ICsvReader)
 WRITER = component.getUtility(core.ICsvWriter)
@@ -22,7 +23,7 @@ def gold_standards_mse(models):
     db = iDB('insilico', INSILICO_SETUP)
     
     gold_dataset = map(lambda idmodel: (idmodel, db.get_model(idmodel), db.get_all_dataset(idmodel)), models)
-    return [(idmodel, gold.mse(dataset, 1)) for idmodel, gold, dataset in gold_dataset]
+    return [(idmodel, Simulator(gold, INSILICO_SETUP.readouts).mse(dataset, 1)) for idmodel, gold, dataset in gold_dataset]
 
 def iter_gold_standards_mse(models):
     for idmodel, mse in gold_standards_mse(models):
@@ -70,3 +71,66 @@ def write_midas_file(idmodel, it, filename):
     WRITER.load(iter_dataset(dataset, header), header)
     WRITER.write(filename)
     
+
+def timings(by=('phase',), db=None):
+    """
+    Aggregates the benchmark_timings table grouping by the given columns, e.g., ('idmodel', 'phase').
+    It returns a list of dicts with the number of calls, total wall, CPU and solver time, and peak RSS (in KB).
+    """
+    db = db or iDB('insilico', INSILICO_SETUP)
+    group = ",".join(by)
+    
+    con = db.connect()
+    with con:
+        cur = con.cursor()
+        cur.execute("SELECT %s, SUM(calls) AS calls, SUM(wall) AS wall, SUM(cpu) AS cpu, SUM(solver) AS solver, \
+            MAX(rss) AS rss, MAX(solver_rss) AS solver_rss FROM benchmark_timings GROUP BY %s ORDER BY %s" % (group, group, group))
+        
+        return map(dict, cur.fetchall())
+
+def write_timings(filename, by=('phase',), db=None):
+    """
+    Writes a CSV file with the aggregated timings (see timings)
+    """
+    header = list(by) + ['calls', 'wall', 'cpu', 'solver', 'rss', 'solver_rss']
+    WRITER.load(timings(by, db), header)
+    WRITER.write(filename)
+
+def solver_stats(by=('phase',), db=None):
+    """
+    Aggregates the benchmark_solver table grouping by the given columns, e.g., ('idmodel', 'phase').
+    It returns a list of dicts with the number of calls, total grounding, solving and CPU time, choices, conflicts
+    and models, and the max number of threads.
+    """
+    db = db or iDB('insilico', INSILICO_SETUP)
+    group = ",".join(by)
+    
+    con = db.connect()
+    with con:
+        cur = con.cursor()
+        cur.execute("SELECT %s, SUM(calls) AS calls, SUM(ground) AS ground, SUM(solve) AS solve, SUM(cpu) AS cpu, \
+            SUM(choices) AS choices, SUM(conflicts) AS conflicts, SUM(models) AS models, MAX(threads) AS threads \
+            FROM benchmark_solver GROUP BY %s ORDER BY %s" % (group, group, group))
+        
+        return map(dict, cur.fetchall())
+
+def learned_networks(idmodel, it, db=None):
+    """
+    For a gold standard id and iteration number, it returns the networks learned in that iteration
+    """
+    db = db or iDB('insilico', INSILICO_SETUP)
+    return db.get_networks(idmodel, it)
+
+def networks_diff(idmodel, it1, it2, db=None):
+    """
+    For a gold standard id and two iteration numbers, it returns the number of networks learned in both iterations,
+    only in the first one and only in the second one (iterations without networks have none)
+    """
+    db = db or iDB('insilico', INSILICO_SETUP)
+    def rows(it):
+        packed = db.get_network_bits(idmodel, it)
+        return set(row.tostring() for row in packed) if packed is not None else set()
+    
+    first, second = rows(it1), rows(it2)
+    
+    return {'both': len(first & second), 'first': len(first - second), 'second': len(second - first)}
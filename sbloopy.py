@@ -7,6 +7,23 @@ from caspo import core, learn, analyze, design
 
 from DB import iDB, rDB
 from Workflow import Workflow
+from StatsClingo import StatsClingo, WatchedClingo
+from Generator import Generator
+
+def budget(value):
+    """
+    Parses a budget PHASE:SECONDS[:MB] (see Watchdog)
+    """
+    parts = value.split(':')
+    if len(parts) not in (2, 3) or parts[0] not in ('learn', 'tolerance', 'analyze', 'design'):
+        raise argparse.ArgumentTypeError("expected PHASE:SECONDS[:MB] with PHASE among learn, tolerance, analyze and design, got %s" % value)
+    
+    try:
+        limits = tuple(float(p) for p in parts[1:]) + (0,) * (3 - len(parts))
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid budget %s" % value)
+    
+    return parts[0], limits
 
 if __name__ == "__main__":
     pparser = argparse.ArgumentParser(add_help=False)
@@ -18,10 +35,37 @@ if __name__ == "__main__":
     pparser.add_argument("--total-exps", dest="mexps", type=int, default=80, metavar="M", help="total number of experiments (Default to 80)")
     pparser.add_argument("--threads", dest="threads", type=int, metavar="T", help="number of threads")
     pparser.add_argument("--conf", dest="conf", default="many", metavar="C", help="threads configurations (Default to many)")
+    pparser.add_argument("--columnar", dest="columnar", action="store_true", help="hold datasets in columnar numpy arrays")
+    pparser.add_argument("--behaviors-cache", dest="cache", type=int, default=100000, metavar="B", 
+                         help="max number of networks whose behavior is remembered across iterations, 0 to disable (Default to 100000)")
+    pparser.add_argument("--result-cache", dest="results", type=int, default=0, metavar="R", 
+                         help="max size in MB of the on-disk cache of learning, analysis and design results, 0 to disable (Default to 0)")
+    pparser.add_argument("--timings", dest="timings", metavar="F", help="append the time and memory used by each phase as JSON lines to F")
+    pparser.add_argument("--stream", dest="stream", type=int, default=0, metavar="K", 
+                         help="learn and analyze streaming networks in chunks of K, 0 to disable (Default to 0)")
+    pparser.add_argument("--stream-memory", dest="spill", type=int, default=256, metavar="M", 
+                         help="max size in MB of streamed networks held in memory before spilling to disk (Default to 256)")
+    pparser.add_argument("--budget", dest="budgets", type=budget, action="append", default=[], metavar="P:S[:M]", 
+                         help="kill the solver when phase P (learn, tolerance, analyze or design) runs for more than S seconds (0 for no limit) \
+                         or uses more than M MB, can be given for each phase")
 
     pparser2 = argparse.ArgumentParser(add_help=False)
     pparser2.add_argument("--bench-n", dest="n", type=int, default=1, metavar="N", help="number of benchmarks to run (Default to 1)")
     pparser2.add_argument("--max-exps", dest="exps", type=int, default=5, metavar="E", help="max number of experiments per design (Default to 5)")
+    pparser2.add_argument("--jobs", dest="jobs", type=int, default=1, metavar="J", help="number of benchmarks to run in parallel processes (Default to 1)")
+    pparser2.add_argument("--tolerance-search", dest="tolerance", choices=["iterative", "single"], default="iterative", 
+                          help="learn again for each tolerance step or enumerate once per kind of tolerance and filter (Default to iterative)")
+    pparser2.add_argument("--seed", type=int, metavar="S", 
+                          help="seed for generating benchmarks and choosing among optimal designs (Default to no seed)")
+    mode = pparser2.add_mutually_exclusive_group()
+    mode.add_argument("--queue", dest="queue", action="store_true", 
+                       help="create the DB and queue the benchmarks for workers instead of running them")
+    mode.add_argument("--worker", dest="worker", metavar="W", 
+                       help="run benchmarks claimed from the queue as worker W, writing results to the DB shard <db>-W")
+    pparser2.add_argument("--lease", dest="lease", type=int, default=600, metavar="L", 
+                          help="seconds without heartbeat after which a benchmark claimed by a worker is claimed again (Default to 600)")
+    pparser2.add_argument("--attempts", dest="attempts", type=int, default=3, metavar="A", 
+                          help="times a benchmark is claimed by workers before it's marked as failed (Default to 3)")
                                     
     parser = argparse.ArgumentParser("sbloopy", description="The loop of systems biology for logic-based modeling using caspo")                       
     subparsers = parser.add_subparsers(title='sbloopy subcommands', dest='cmd',
@@ -48,19 +92,77 @@ if __name__ == "__main__":
     random.add_argument("bench", type=int, default=0, help="run workflow for a given benchmark using random experimental designs (Default to 0)")
     random.add_argument("--step", type=int, default=16, help="number of random experiments to add per iteration (Default to 16)")
     random.add_argument("--repeat", dest="n", type=int, default=1, metavar="N", help="number of random runs (Default to 1)")
+    random.add_argument("--seed", type=int, metavar="S", help="seed for the random designs; run i uses S+i (Default to no seed)")
+    random.add_argument("--jobs", dest="jobs", type=int, default=1, metavar="J", help="number of random runs to run in parallel processes (Default to 1)")
+    
+    generate = subparsers.add_parser("generate")
+    generate.add_argument("pkn", help="output prior knowledge network in SIF format")
+    generate.add_argument("midas", help="output experimental setup in MIDAS file")
+    generate.add_argument("--nodes", type=int, default=100, metavar="N", help="number of nodes (Default to 100)")
+    generate.add_argument("--stimuli", type=int, default=5, metavar="S", help="number of stimuli (Default to 5)")
+    generate.add_argument("--inhibitors", type=int, default=5, metavar="I", help="number of inhibitors (Default to 5)")
+    generate.add_argument("--readouts", type=int, default=10, metavar="R", help="number of readouts (Default to 10)")
+    generate.add_argument("--in-degree", dest="indegree", type=int, default=2, metavar="D", help="max number of incoming edges per node (Default to 2)")
+    generate.add_argument("--negative", type=float, default=0.2, metavar="P", help="probability of negative edges (Default to 0.2)")
+    generate.add_argument("--seed", type=int, metavar="S", help="seed for the random generator (Default to no seed)")
+    
+    merge = subparsers.add_parser("merge")
+    merge.add_argument("midas", help="experimental setup in MIDAS file (the follow up for real)")
+    merge.add_argument("type", choices=["insilico", "real"], help="type of simulation")
     
     args = parser.parse_args()
     
+    if args.cmd == 'generate':
+        try:
+            generator = Generator(args.nodes, args.stimuli, args.inhibitors, args.readouts, args.indegree, args.negative, args.seed)
+        except ValueError as e:
+            generate.error(str(e))
+        
+        generator.write_sif(args.pkn)
+        generator.write_midas(args.midas)
+        sys.exit(0)
+    
+    if args.cmd == 'merge':
+        reader = component.getUtility(core.ICsvReader)
+        reader.read(args.midas)
+        dataset = core.IDataset(reader)
+        
+        db = iDB('insilico', dataset.setup, journal_mode='DELETE') if args.type == 'insilico' else rDB('real', dataset.setup, journal_mode='DELETE')
+        states, workers, failed = db.get_queue()
+        for worker, idmodels in sorted(workers.iteritems()):
+            db.merge_shard(worker, idmodels)
+            sys.stdout.write("Merged %s benchmark(s) from %s-%s\n" % (len(idmodels), db.name, worker))
+            
+        for idmodel, worker, attempts in failed:
+            sys.stdout.write("Benchmark %s failed after %s attempt(s), last by %s (see workflow-%s-%s.log)\n" % (idmodel, attempts, worker, db.name, worker))
+            
+        sys.stdout.write("Benchmarks done: %s, running: %s, queued: %s, failed: %s\n" 
+                         % (states.get('done', 0), states.get('running', 0), states.get('queued', 0), states.get('failed', 0)))
+        sys.exit(0)
+    
     potassco.configure(clingo=args.clingo)
+    # clingo statistics are only requested when timings are written
+    solver = StatsClingo(args.clingo) if args.timings else WatchedClingo(args.clingo)
+    component.getGlobalSiteManager().registerUtility(solver, potassco.IClingo)
     
     sif = component.getUtility(core.IFileReader)
     sif.read(args.pkn)
     graph = core.IGraph(sif)
     
+    jobs = getattr(args, 'jobs', 1)
+    worker = getattr(args, 'worker', None)
+    if worker and jobs > 1:
+        parser.error("--worker runs a single process, start several workers instead of using --jobs")
+    
+    # WAL mode doesn't work on network filesystems, so DBs shared by workers use a rollback journal
+    journal = 'DELETE' if worker or getattr(args, 'queue', False) else 'WAL'
     if args.threads:
         learn.register_mt(args.threads, args.conf)
-        analyze.register_mt(args.threads)
         design.register_mt(args.threads, args.conf)
+        
+        # caspo analysis forks its own pool which is not allowed within pool workers
+        if jobs <= 1:
+            analyze.register_mt(args.threads)
     
     dconf = {}
     if args.stimuli > 0:
@@ -76,15 +178,27 @@ if __name__ == "__main__":
         reader.read(args.midas)
         dataset = core.IDataset(reader)
         
-        db = iDB('insilico', dataset.setup)
+        db = iDB('insilico', dataset.setup, columnar=args.columnar, journal_mode=journal)
         
-        if not args.resume:
+        if worker:
+            queue, db = db, db.shard(worker)
+        elif not args.resume:
             db.create_db()
             db.load_pkn(graph, args.len)
-            db.generate_benchmarks(args.n, (args.lsize,args.usize), (args.lands,args.uands), args.len)
+            db.generate_benchmarks(args.n, (args.lsize,args.usize), (args.lands,args.uands), args.len, args.seed)
+        else:
+            db.upgrade_db()
 
-        workflow = Workflow(db, graph, args.len, dconf, mexps=args.mexps)
-        workflow.run(args.n, args.resume)
+        if args.queue:
+            db.insert_queue(xrange(args.n))
+            sys.exit(0)
+
+        workflow = Workflow(db, graph, args.len, dconf, mexps=args.mexps, tolerance=args.tolerance, cache=args.cache, results=args.results, timings=args.timings, seed=args.seed, 
+                            stream=args.stream, spill=args.spill, budgets=dict(args.budgets))
+        if worker:
+            workflow.run_queue(queue, worker, args.lease, args.attempts)
+        else:
+            workflow.run(args.n, args.resume, jobs)
         
     elif args.cmd == 'real':
         dconf['max_experiments'] = args.exps
@@ -96,24 +210,38 @@ if __name__ == "__main__":
         reader.read(args.screening)
         screening = core.IDataset(reader)
         
-        db = rDB('real', followup.setup)
+        db = rDB('real', followup.setup, columnar=args.columnar, journal_mode=journal)
         
-        if not args.resume:
+        if worker:
+            queue, db = db, db.shard(worker)
+        elif not args.resume:
             db.create_db()
             db.load_pkn(graph, args.len)
         
             for idmodel in xrange(args.n):
                 db.insert_data(idmodel, screening, args.stime, followup, args.ftime)
+        else:
+            db.upgrade_db()
+    
+        if args.queue:
+            db.insert_queue(xrange(args.n))
+            sys.exit(0)
     
-        workflow = Workflow(db, graph, args.len, dconf, mexps=args.mexps, lexps=followup)
-        workflow.run(args.n, args.resume)
+        workflow = Workflow(db, graph, args.len, dconf, mexps=args.mexps, lexps=followup, tolerance=args.tolerance, cache=args.cache, results=args.results, timings=args.timings, seed=args.seed, 
+                            stream=args.stream, spill=args.spill, budgets=dict(args.budgets))
+        if worker:
+            workflow.run_queue(queue, worker, args.lease, args.attempts)
+        else:
+            workflow.run(args.n, args.resume, jobs)
         
     else:
         reader = component.getUtility(core.ICsvReader)
         reader.read(args.midas)
         dataset = core.IDataset(reader)
             
-        db = iDB('insilico', dataset.setup) if args.type == 'insilico' else rDB('real', dataset.setup)
+        db = iDB('insilico', dataset.setup, columnar=args.columnar) if args.type == 'insilico' else rDB('real', dataset.setup, columnar=args.columnar)
+        db.upgrade_db()
             
-        workflow = Workflow(db, graph, args.len, dconf, mexps=args.mexps)
-        workflow.run_random(args.n, args.bench, args.step)
+        workflow = Workflow(db, graph, args.len, dconf, mexps=args.mexps, cache=args.cache, results=args.results, timings=args.timings, 
+                            stream=args.stream, spill=args.spill, budgets=dict(args.budgets))
+        workflow.run_random(args.n, args.bench, args.step, args.seed, jobs)
@@ -0,0 +1,50 @@
+import shutil
+import tempfile
+import unittest
+from collections import defaultdict
+
+from pyzcasp import potassco
+from caspo import core, analyze
+
+from Dataset import Dataset
+from Learner import Learner
+from BehaviorCache import BehaviorCache
+from tests.test_dataset import SETUP, rows
+from tests.test_learner import graph, setUpModule
+from tests.test_workflow import groups
+
+class BehaviorCacheTestCase(unittest.TestCase):
+    
+    def setUp(self):
+        self.path = tempfile.mkdtemp(prefix='sbloopy-test-')
+        self.session = Learner(graph(self.path), SETUP, 2, potassco.IClingo, "round", 100)
+        self.data = Dataset.from_db_rows(rows(20), SETUP)
+    
+    def tearDown(self):
+        shutil.rmtree(self.path)
+    
+    def test_fingerprint(self):
+        x = core.Clause([core.Literal('a', 1), core.Literal('c', -1)])
+        y = core.Clause([core.Literal('b', 1)])
+        
+        # as built by DB.get_model and DB.decode_networks
+        mapping = defaultdict(list)
+        mapping['x'].append(x)
+        mapping['y'].extend([y, core.Clause([core.Literal('x', 1)])])
+        network = core.BooleLogicNetwork(['a', 'b', 'c', 'x', 'y'], mapping)
+        reordered = core.BooleLogicNetwork(['a', 'b', 'c', 'x', 'y'], {'x': [x], 'y': [core.Clause([core.Literal('x', 1)]), y]})
+        
+        self.assertEqual(BehaviorCache.fingerprint(network), BehaviorCache.fingerprint(reordered))
+    
+    def test_behaviors(self):
+        networks = list(self.session.learner(self.data).learn(0, 2))
+        half = len(networks) // 2
+        
+        cache = BehaviorCache()
+        for subset in [networks[:half + 1], networks[half // 2:]]:
+            subset = core.BooleLogicNetworkSet(subset, update_names=False)
+            expected = analyze.behaviors(subset, self.data, potassco.IClingo)
+            self.assertEqual(groups(subset, cache.behaviors(subset, self.data)), groups(subset, expected))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import random
+import sqlite3 as lite
+import unittest
+
+from caspo import core
+
+from Dataset import Dataset, ColumnarDataset
+
+SETUP = core.Setup(['a', 'b'], ['c'], ['x', 'y'])
+
+def rows(n, seed=0):
+    """
+    Returns n sqlite rows of random experiments over SETUP with duplicated clampings and missing values
+    """
+    rng = random.Random(seed)
+    con = lite.connect(':memory:')
+    con.row_factory = lite.Row
+    cur = con.cursor()
+    cur.execute("CREATE TABLE dataset (a INT, b INT, ci INT, x, y)")
+    for _ in xrange(n):
+        values = [rng.choice([rng.random(), "NaN"]) for _ in SETUP.readouts]
+        cur.execute("INSERT INTO dataset VALUES (?,?,?,?,?)", [rng.randint(0, 1) for _ in xrange(3)] + values)
+    
+    cur.execute("SELECT * FROM dataset")
+    return cur.fetchall()
+
+class ColumnarDatasetTestCase(unittest.TestCase):
+    
+    def setUp(self):
+        self.rows = rows(30)
+        self.dataset = Dataset.from_db_rows(self.rows, SETUP)
+        self.columnar = ColumnarDataset.from_db_rows(self.rows, SETUP)
+    
+    def test_experiments(self):
+        self.assertEqual(self.dataset.nexps, self.columnar.nexps)
+        self.assertEqual(list(self.dataset.at(1)), list(self.columnar.at(1)))
+    
+    def test_nobs(self):
+        self.assertEqual(self.dataset.nobs[1], self.columnar.nobs[1])
+        self.assertEqual(self.columnar.nobs[1], sum(1 for row in self.rows for r in SETUP.readouts if row[r] != "NaN"))
+    
+    def test_mse(self):
+        x = core.Clause([core.Literal('a', 1), core.Literal('c', -1)])
+        y = core.Clause([core.Literal('b', 1)])
+        network = core.BooleLogicNetwork(['a', 'b', 'c', 'x', 'y'], {'x': [x], 'y': [y, core.Clause([core.Literal('x', 1)])]})
+        
+        self.assertEqual(network.mse(self.dataset, 1), network.mse(self.columnar, 1))
+    
+    def test_pop_sample(self):
+        self.dataset.seed(1)
+        self.columnar.seed(1)
+        self.assertEqual(self.dataset.pop_sample(5), self.columnar.pop_sample(5))
+        self.assertEqual(self.dataset.nobs[1], self.columnar.nobs[1])
+
+if __name__ == '__main__':
+    unittest.main()
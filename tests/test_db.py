@@ -0,0 +1,181 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from caspo import core
+
+from DB import DB, rDB
+from ResultCache import ResultCache
+from Dataset import Dataset
+from tests.test_dataset import SETUP, rows
+
+class ClampingKeyTestCase(unittest.TestCase):
+    
+    def setUp(self):
+        self.path = tempfile.mkdtemp(prefix='sbloopy-test-')
+    
+    def tearDown(self):
+        shutil.rmtree(self.path)
+    
+    def check_keys(self, nstimuli, ninhibitors):
+        setup = core.Setup(['s%s' % i for i in xrange(nstimuli)], ['i%s' % i for i in xrange(ninhibitors)], ['r'])
+        db = DB(os.path.join(self.path, 'db'), setup)
+        db.create_db()
+        
+        rng = random.Random(0)
+        rows = [[rng.randint(0, 1) for _ in xrange(nstimuli + ninhibitors)] + [0.5, 0] for _ in xrange(10)]
+        clampings = [core.Clamping([core.Literal(s, 1 if v else -1) for s, v in zip(setup.stimuli, row)] + 
+                                   [core.Literal(i, -1) for i, v in zip(setup.inhibitors, row[nstimuli:]) if v]) for row in rows]
+        
+        con = db.connect()
+        with con:
+            cur = con.cursor()
+            db.insert_rows(cur, 'dataset', rows)
+            cur.execute("SELECT key, %s FROM dataset ORDER BY rowid" % db.get_key_sql())
+            keys = cur.fetchall()
+        
+        self.assertEqual([key for key, _ in keys], [sql for _, sql in keys])
+        self.assertEqual([key for key, _ in keys], map(db.get_key, clampings))
+        
+        db.insert_benchmarking_data(0, clampings[:3], 1)
+        self.assertEqual(db.check_clampings(0, clampings), [c for c in clampings[3:] if c not in clampings[:3]])
+        return db
+    
+    def test_integer_keys(self):
+        self.assertEqual(self.check_keys(5, 3).key_type, 'INT')
+    
+    def test_text_keys(self):
+        self.assertEqual(self.check_keys(40, 30).key_type, 'TEXT')
+
+class QueueTestCase(unittest.TestCase):
+    
+    def setUp(self):
+        self.path = tempfile.mkdtemp(prefix='sbloopy-test-')
+        self.db = DB(os.path.join(self.path, 'db'), core.Setup(['a'], ['b'], ['c']))
+        self.db.create_db()
+        self.db.insert_queue(xrange(2))
+    
+    def tearDown(self):
+        shutil.rmtree(self.path)
+    
+    def test_release_until_failed(self):
+        for attempt in xrange(2):
+            self.assertEqual(self.db.claim_benchmark('w1', 600, 2), 0)
+            self.db.release_benchmark(0, 'w1', 2)
+        
+        self.assertEqual(self.db.claim_benchmark('w1', 600, 2), 1)
+        self.assertTrue(self.db.finish_benchmark(1, 'w1'))
+        self.assertEqual(self.db.claim_benchmark('w1', 600, 2), None)
+        
+        states, workers, failed = self.db.get_queue()
+        self.assertEqual(states, {'done': 1, 'failed': 1})
+        self.assertEqual(dict(workers), {'w1': [1]})
+        self.assertEqual(failed, [(0, 'w1', 2)])
+    
+    def test_expired_until_failed(self):
+        self.assertEqual(self.db.claim_benchmark('w1', 600, 1), 0)
+        # w1 crashed, so its lease expires
+        self.assertEqual(self.db.claim_benchmark('w2', -1, 1), 1)
+        self.assertEqual(self.db.claim_benchmark('w2', -1, 1), None)
+        
+        states, workers, failed = self.db.get_queue()
+        self.assertEqual(states, {'failed': 2})
+        self.assertEqual(failed, [(0, 'w1', 1), (1, 'w2', 1)])
+
+class IngestionTestCase(unittest.TestCase):
+    
+    def setUp(self):
+        self.path = tempfile.mkdtemp(prefix='sbloopy-test-')
+        self.db = rDB(os.path.join(self.path, 'db'), SETUP)
+        self.db.create_db()
+    
+    def tearDown(self):
+        shutil.rmtree(self.path)
+    
+    def test_insert_data(self):
+        screening = Dataset.from_db_rows(rows(30, 1), SETUP)
+        followup = Dataset.from_db_rows(rows(30, 2), SETUP)
+        for idmodel in xrange(2):
+            self.db.insert_data(idmodel, screening, 1, followup, 1)
+        
+        for idmodel in xrange(2):
+            self.assertEqual(list(self.db.get_all_dataset(idmodel).at(1)), list(followup.at(1)))
+        
+        con = self.db.connect()
+        with con:
+            count = con.execute("SELECT COUNT(*) FROM screening WHERE idmodel=0").fetchone()[0]
+            keys = con.execute("SELECT key, %s FROM dataset" % self.db.get_key_sql()).fetchall()
+        
+        self.assertEqual(count, sum(1 for i, clamping, obs in screening.at(1) if all(k in SETUP.stimuli or v != 1 for k, v in clamping)))
+        self.assertEqual([key for key, _ in keys], [sql for _, sql in keys])
+
+class NetworksTestCase(unittest.TestCase):
+    
+    def setUp(self):
+        self.path = tempfile.mkdtemp(prefix='sbloopy-test-')
+        
+        self.hypers = []
+        for var in ['x', 'y']:
+            for src in ['a', 'b', 'c']:
+                for sign in [1, -1]:
+                    self.hypers.append((core.Clause([core.Literal(src, sign)]), var))
+        
+        self.hypers.append((core.Clause([core.Literal('a', 1), core.Literal('c', -1)]), 'x'))
+        self.hypers.append((core.Clause([core.Literal('b', 1), core.Literal('x', 1)]), 'y'))
+    
+    def tearDown(self):
+        shutil.rmtree(self.path)
+    
+    def create_db(self, nclauses):
+        db = DB(os.path.join(self.path, 'db-%s' % nclauses), SETUP)
+        db.create_db()
+        
+        con = db.connect()
+        with con:
+            con.executemany("INSERT INTO pkn (hyper) VALUES (?)", [("%s=%s" % hyper,) for hyper in self.hypers[:nclauses]])
+        
+        return db
+    
+    def networks(self, n, nclauses, seed=0):
+        rng = random.Random(seed)
+        networks = []
+        for _ in xrange(n):
+            mapping = {}
+            for clause, var in rng.sample(self.hypers[:nclauses], rng.randint(1, nclauses)):
+                mapping.setdefault(var, []).append(clause)
+            
+            networks.append(core.BooleLogicNetwork(['a', 'b', 'c', 'x', 'y'], mapping))
+        
+        return networks
+    
+    def dumps(self, networks):
+        return sorted(sorted(ResultCache.dump_network(network).items()) for network in networks)
+    
+    def test_round_trip(self):
+        for nclauses in [5, 8, 14]:
+            db = self.create_db(nclauses)
+            networks = self.networks(20, nclauses)
+            
+            packed = db.encode_networks(networks)
+            self.assertEqual(packed.shape, (20, (nclauses + 7) // 8))
+            self.assertEqual(self.dumps(db.decode_networks(packed)), self.dumps(networks))
+            
+            db.insert_networks(0, 1, networks)
+            self.assertEqual(db.get_network_bits(0, 1).tostring(), packed.tostring())
+            
+            restored = db.get_networks(0, 1)
+            self.assertEqual(self.dumps(restored), self.dumps(networks))
+            self.assertEqual(self.dumps(ResultCache.load_network(ResultCache.dump_network(network)) for network in restored), self.dumps(networks))
+    
+    def test_no_networks(self):
+        db = self.create_db(5)
+        db.insert_networks(0, 1, [])
+        
+        self.assertEqual(db.get_network_bits(0, 1).shape, (0, 1))
+        self.assertEqual(len(db.get_networks(0, 1)), 0)
+        self.assertEqual(db.get_network_bits(0, 2), None)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+from pyzcasp import potassco
+from caspo import analyze
+
+from DB import iDB
+from Dataset import Dataset
+from Learner import Learner
+from Enumerator import Enumerator, NetworkStore
+from tests.test_dataset import SETUP, rows
+from tests.test_learner import graph, dumps, setUpModule
+from tests.test_workflow import groups
+
+class EnumeratorTestCase(unittest.TestCase):
+    
+    def setUp(self):
+        self.path = tempfile.mkdtemp(prefix='sbloopy-test-')
+        self.graph = graph(self.path)
+        
+        self.db = iDB(os.path.join(self.path, 'db'), SETUP)
+        self.db.create_db()
+        self.db.load_pkn(self.graph, 2)
+        
+        self.session = Learner(self.graph, SETUP, 2, potassco.IClingo, "round", 100)
+        self.data = Dataset.from_db_rows(rows(20), SETUP)
+    
+    def tearDown(self):
+        shutil.rmtree(self.path)
+    
+    def test_store(self):
+        rng = np.random.RandomState(0)
+        packed = np.packbits(rng.randint(0, 2, size=(12, len(self.db.get_clauses()))).astype(bool), axis=1)
+        
+        store = NetworkStore(self.db)
+        self.assertTrue(len(store.buffer) < store.capacity)
+        
+        store.capacity = 5
+        for row in packed:
+            store.append(row)
+        
+        self.assertEqual((len(store), store.spilled), (12, 10))
+        self.assertEqual(np.vstack([chunk for start, chunk in store.chunks(4)]).tostring(), packed.tostring())
+        
+        subset = store.subset([11, 0, 6])
+        self.assertEqual(subset.read(0, 3).tostring(), packed[[11, 0, 6]].tostring())
+        self.assertEqual(dumps(subset), dumps(self.db.decode_networks(packed[[11, 0, 6]])))
+    
+    def test_learn(self):
+        for fit, size in [(0, 0), (0, 1), (0.02, 0)]:
+            learner = self.session.learner(self.data)
+            expected = learner.learn(fit, size)
+            
+            streamed = self.session.learner(self.data)
+            store = Enumerator(self.db, chunk=3).learn(streamed, fit, size)
+            
+            self.assertEqual(Learner.optimum(streamed), Learner.optimum(learner))
+            self.assertEqual(dumps(store), dumps(expected))
+    
+    def test_behaviors(self):
+        networks = self.session.learner(self.data).learn(0, 2)
+        store = NetworkStore(self.db)
+        for row in self.db.encode_networks(list(networks)):
+            store.append(row)
+        
+        expected = analyze.behaviors(networks, self.data, potassco.IClingo)
+        for chunk in [1, 4, len(networks)]:
+            behaviors = Enumerator(self.db, chunk=chunk).behaviors(store, self.data)
+            self.assertEqual(groups(store, behaviors), groups(networks, expected))
+
+if __name__ == '__main__':
+    unittest.main()
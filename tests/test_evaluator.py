@@ -0,0 +1,100 @@
+import random
+import unittest
+
+from caspo import core, analyze
+from caspo.analyze.adapters import BoolLogicNetworkSet2BooleLogicBehaviorSet
+
+from Dataset import Dataset, ColumnarDataset
+from Evaluator import Evaluator
+from Simulator import Simulator
+from tests.test_dataset import SETUP, rows
+
+class BehaviorSet(BoolLogicNetworkSet2BooleLogicBehaviorSet):
+    """
+    Behaviors as returned by caspo analysis, given instead of found by the solver
+    """
+    
+    def __init__(self, behaviors):
+        core.BooleLogicNetworkSet.__init__(self, behaviors, update_names=False)
+
+class EvaluatorTestCase(unittest.TestCase):
+    
+    def setUp(self):
+        self.rng = random.Random(0)
+        self.datasets = []
+        for seed in xrange(3):
+            data = rows(40, seed)
+            self.datasets.extend([Dataset.from_db_rows(data, SETUP), ColumnarDataset.from_db_rows(data, SETUP)])
+    
+    def behavior(self):
+        """
+        Returns a random acyclic behavior where each variable only depends on the ones before it
+        """
+        order = ['a', 'b', 'c', 'z', 'x', 'y']
+        mapping = {}
+        for k, var in enumerate(order[2:], 2):
+            clauses = []
+            for _ in xrange(self.rng.randint(0, 2)):
+                sources = self.rng.sample(order[:k], self.rng.randint(1, 2))
+                clauses.append(core.Clause([core.Literal(src, self.rng.choice([1, -1])) for src in sources]))
+            
+            if clauses:
+                mapping[var] = clauses
+        
+        behavior = analyze.BooleLogicBehavior(order, mapping)
+        # only the number of networks of a behavior matters for its weight
+        behavior.networks = set(xrange(self.rng.randint(0, 3)))
+        return behavior
+    
+    def behaviors(self):
+        return BehaviorSet([self.behavior() for _ in xrange(self.rng.randint(1, 6))])
+    
+    def cyclic(self):
+        """
+        Returns a behavior where z and x depend on each other, so that synchronous updates oscillate from all-False
+        """
+        mapping = {'z': [core.Clause([core.Literal('a', 1)]), core.Clause([core.Literal('x', -1)])],
+                   'x': [core.Clause([core.Literal('z', 1)])],
+                   'y': [core.Clause([core.Literal('x', 1), core.Literal('b', -1)])]}
+        
+        behavior = analyze.BooleLogicBehavior(['a', 'b', 'c', 'z', 'x', 'y'], mapping)
+        behavior.networks = set([0])
+        return behavior
+    
+    def test_mse(self):
+        for _ in xrange(20):
+            behaviors = self.behaviors()
+            for dataset in self.datasets:
+                self.assertAlmostEqual(Evaluator(behaviors, dataset.setup).mse(dataset, 1), behaviors.mse(dataset, 1))
+    
+    def test_mses(self):
+        for _ in xrange(20):
+            behaviors = self.behaviors()
+            for dataset in self.datasets:
+                expected = [mse for behavior, mse in behaviors.itermses(dataset, 1)]
+                for mse, simulated, evaluated in zip(expected, map(lambda b: Simulator(b, SETUP.readouts).mse(dataset, 1), behaviors),
+                                                     Evaluator(behaviors, dataset.setup).mses(dataset, 1)):
+                    self.assertAlmostEqual(simulated, mse)
+                    self.assertAlmostEqual(evaluated, mse)
+    
+    def test_cyclic(self):
+        cyclic = self.cyclic()
+        self.assertFalse(Simulator(cyclic, SETUP.readouts).acyclic)
+        self.assertRaises(ValueError, Simulator(cyclic, SETUP.readouts).simulate, [core.Clamping([])])
+        for _ in xrange(5):
+            self.assertTrue(Simulator(self.behavior(), SETUP.readouts).acyclic)
+        
+        for _ in xrange(5):
+            behaviors = BehaviorSet([self.behavior(), cyclic])
+            for dataset in self.datasets:
+                expected = [mse for behavior, mse in behaviors.itermses(dataset, 1)]
+                evaluator = Evaluator(behaviors, dataset.setup)
+                self.assertFalse(evaluator.acyclic)
+                self.assertAlmostEqual(evaluator.mse(dataset, 1), behaviors.mse(dataset, 1))
+                for mse, evaluated in zip(expected, evaluator.mses(dataset, 1)):
+                    self.assertAlmostEqual(evaluated, mse)
+                
+                self.assertAlmostEqual(Simulator(cyclic, SETUP.readouts).mse(dataset, 1), cyclic.mse(dataset, 1))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from zope import component
+from caspo import core
+
+from DB import DB
+from Generator import Generator
+
+class GeneratorTestCase(unittest.TestCase):
+    
+    def setUp(self):
+        self.path = tempfile.mkdtemp(prefix='sbloopy-test-')
+    
+    def tearDown(self):
+        shutil.rmtree(self.path)
+    
+    def test_wide_setup(self):
+        generator = Generator(120, 40, 30, 5, seed=0)
+        midas = os.path.join(self.path, 'setup.csv')
+        generator.write_midas(midas)
+        
+        reader = component.getUtility(core.ICsvReader)
+        reader.read(midas)
+        setup = core.IDataset(reader).setup
+        self.assertEqual((set(setup.stimuli), set(setup.inhibitors)), (set(generator.stimuli), set(generator.inhibitors)))
+        
+        db = DB(os.path.join(self.path, 'db'), setup)
+        db.create_db()
+        self.assertEqual(db.key_type, 'TEXT')
+        
+        n = len(setup.stimuli) + len(setup.inhibitors)
+        rows = [[1 if i == j else 0 for i in xrange(n)] + [0.5] * len(setup.readouts) + [0] for j in xrange(-1, n)]
+        con = db.connect()
+        with con:
+            cur = con.cursor()
+            db.insert_rows(cur, 'dataset', rows)
+            cur.execute("SELECT key, %s FROM dataset ORDER BY rowid" % db.get_key_sql())
+            keys = cur.fetchall()
+        
+        self.assertEqual([key for key, _ in keys], [sql for _, sql in keys])
+        self.assertEqual(len(set(key for key, _ in keys)), n + 1)
@@ -0,0 +1,69 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from zope import component
+from pyzcasp import potassco
+from caspo import core, learn
+
+from Dataset import Dataset
+from Learner import Learner
+from ResultCache import ResultCache
+from tests.test_dataset import SETUP, rows
+
+# small PKN over SETUP with a feedback-free path from every cue to every readout
+PKN = [('a', 1, 'x'), ('b', 1, 'x'), ('c', -1, 'x'), ('a', 1, 'c'), ('b', 1, 'y'), ('x', 1, 'y'), ('c', 1, 'y')]
+
+def setUpModule():
+    if component.queryUtility(potassco.IClingo) is None:
+        potassco.configure(clingo='clingo')
+
+def graph(path):
+    """
+    Returns the PKN read from a SIF file written in path
+    """
+    filename = os.path.join(path, 'pkn.sif')
+    with open(filename, 'w') as f:
+        for source, sign, target in PKN:
+            f.write("%s\t%s\t%s\n" % (source, sign, target))
+    
+    sif = component.getUtility(core.IFileReader)
+    sif.read(filename)
+    return core.IGraph(sif)
+
+def dumps(networks):
+    return ResultCache.sort_networks(networks)[0]
+
+class LearnerTestCase(unittest.TestCase):
+    
+    def setUp(self):
+        self.path = tempfile.mkdtemp(prefix='sbloopy-test-')
+        self.graph = graph(self.path)
+        self.session = Learner(self.graph, SETUP, 2, potassco.IClingo, "round", 100)
+    
+    def tearDown(self):
+        shutil.rmtree(self.path)
+    
+    def test_learn(self):
+        for seed in xrange(3):
+            data = Dataset.from_db_rows(rows(20, seed), SETUP)
+            learner = self.session.learner(data)
+            expected = learn.learner(self.graph, data, 1, 2, potassco.IClingo, "round", 100)
+            
+            self.assertEqual(learner.termset, expected.termset)
+            self.assertEqual(dumps(learner.learn(0, 1)), dumps(expected.learn(0, 1)))
+    
+    def test_optimum(self):
+        learner = self.session.learner(Dataset.from_db_rows(rows(20), SETUP))
+        self.assertRaises(ValueError, Learner.optimum, learner)
+        
+        learner.learn(0, 0)
+        optimal = Learner.optimum(learner)
+        
+        restored = self.session.learner(Dataset.from_db_rows(rows(20), SETUP))
+        Learner.restore_optimum(restored, list(optimal))
+        self.assertEqual(Learner.optimum(restored), optimal)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+from ResultCache import ResultCache
+
+class Learner(object):
+    """
+    caspo learner counting its calls
+    """
+    
+    def __init__(self):
+        self.optimal = None
+        self.calls = 0
+    
+    def learn(self, fit, size):
+        self.calls += 1
+        self.optimal = (10, 4)
+        return []
+
+class Designer(object):
+    """
+    caspo designer counting its calls
+    """
+    
+    def __init__(self):
+        self.calls = 0
+    
+    def design(self, **kwargs):
+        self.calls += 1
+        return []
+
+class ResultCacheTestCase(unittest.TestCase):
+    
+    def setUp(self):
+        self.path = tempfile.mkdtemp(prefix='sbloopy-test-')
+        self.cache = ResultCache(os.path.join(self.path, 'results'))
+    
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.path)
+    
+    def test_eviction(self):
+        values = dict((key, os.urandom(512).encode('hex')) for key in 'abcd')
+        self.cache.put('a', values['a'])
+        self.cache.size = 3 * self.cache.connect().execute("SELECT bytes FROM results").fetchone()[0]
+        
+        for key in 'bc':
+            time.sleep(0.01)
+            self.cache.put(key, values[key])
+        
+        # a is used again so b is the least recently used one
+        time.sleep(0.01)
+        self.assertEqual(self.cache.get('a'), values['a'])
+        time.sleep(0.01)
+        self.cache.put('d', values['d'])
+        
+        self.assertEqual(self.cache.get('b'), None)
+        for key in 'acd':
+            self.assertEqual(self.cache.get(key), values[key])
+    
+    def test_learn_keys(self):
+        learner = Learner()
+        inputs = [['a=x'], 2, [['a'], [], ['x']]]
+        dataset = [[['a=1'], [['x', 0.5]]]]
+        
+        self.cache.learn(learner, [inputs, dataset], 0, 1)
+        self.cache.learn(Learner(), [inputs, dataset], 0, 1)
+        self.assertEqual(learner.calls, 1)
+        
+        for args in [([[['a=x'], 3, inputs[2]], dataset], 0, 1), ([inputs, dataset], 0.01, 1), ([inputs, dataset], 0, 2)]:
+            learner = Learner()
+            self.cache.learn(learner, *args)
+            self.assertEqual(learner.calls, 1)
+    
+    def test_design_keys(self):
+        designer = Designer()
+        for dconf in [{'max_experiments': 5}, {'max_experiments': 5}, {'max_experiments': 5, 'max_stimuli': 2}, {'max_experiments': 3}]:
+            self.cache.design(designer, [['a=x'], None], [], **dconf)
+        
+        self.assertEqual(designer.calls, 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,27 @@
+import unittest
+
+from StatsClingo import StatsClingo, WatchedClingo
+
+class StatsClingoTestCase(unittest.TestCase):
+    
+    program = "{a; b; c}. :- a, b."
+    
+    def test_stats(self):
+        clingo = StatsClingo('clingo')
+        snapshot = clingo.totals.copy()
+        answers = list(clingo.run(self.program, [], ['0']))
+        
+        stats = clingo.since(snapshot)
+        self.assertEqual(len(answers), 6)
+        self.assertEqual((stats['calls'], stats['models'], stats['threads']), (1, 6, 1))
+        self.assertEqual(clingo.process.returncode, 30)
+        self.assertTrue(stats['cpu'] >= 0 and stats['ground'] >= 0)
+    
+    def test_without_stats(self):
+        clingo = WatchedClingo('clingo')
+        self.assertEqual(len(list(clingo.run(self.program, [], ['0']))), 6)
+        self.assertEqual(clingo.process.returncode, 30)
+        self.assertFalse('Stats' in clingo.json)
+
+if __name__ == '__main__':
+    unittest.main()
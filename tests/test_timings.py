@@ -0,0 +1,54 @@
+import time
+import unittest
+
+from Timings import Timings, TimedDB
+
+class CountingTimings(Timings):
+    """
+    Timings counting the resets of the high-water mark
+    """
+    
+    resets = 0
+    
+    def reset_hwm(self):
+        self.resets += 1
+        super(CountingTimings, self).reset_hwm()
+
+class DB(object):
+    
+    def query(self, seconds):
+        time.sleep(seconds)
+        return seconds
+
+class TimingsTestCase(unittest.TestCase):
+    
+    def setUp(self):
+        self.timings = CountingTimings(None)
+        self.db = TimedDB(DB(), self.timings)
+    
+    def test_nested(self):
+        with self.timings.phase('learn'):
+            time.sleep(0.1)
+            for _ in xrange(2):
+                self.assertEqual(self.db.query(0.1), 0.1)
+        
+        learn, db = self.timings.records['learn'], self.timings.records['db']
+        self.assertEqual((learn['calls'], db['calls']), (1, 2))
+        self.assertTrue(0.1 <= learn['wall'] < 0.15)
+        self.assertTrue(0.2 <= db['wall'] < 0.25)
+        self.assertTrue(learn['rss'] > 0 and db['rss'] > 0)
+    
+    def test_resets(self):
+        with self.timings.phase('learn'):
+            self.db.query(0)
+            with self.timings.phase('filter'):
+                pass
+        
+        self.db.query(0)
+        with self.timings.phase('design'):
+            pass
+        
+        self.assertEqual(self.timings.resets, 2)
+
+if __name__ == '__main__':
+    unittest.main()
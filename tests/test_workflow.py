@@ -0,0 +1,136 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+import sqlite3 as lite
+from itertools import product
+
+from caspo import core
+
+from DB import iDB
+from Dataset import Dataset
+from Simulator import Simulator
+from ResultCache import ResultCache
+from Workflow import Workflow
+from tests.test_dataset import SETUP
+from tests.test_learner import graph, dumps, setUpModule
+
+# gold standard over the PKN in tests.test_learner
+GOLD = core.BooleLogicNetwork(['a', 'b', 'c', 'x', 'y'], {
+    'c': [core.Clause([core.Literal('a', 1)])],
+    'x': [core.Clause([core.Literal('a', 1), core.Literal('c', -1)])],
+    'y': [core.Clause([core.Literal('b', 1)]), core.Clause([core.Literal('x', 1)])]})
+
+def gold_rows(network):
+    """
+    Returns sqlite rows with the exact predictions of the network for all clampings of SETUP
+    """
+    con = lite.connect(':memory:')
+    con.row_factory = lite.Row
+    cur = con.cursor()
+    cur.execute("CREATE TABLE dataset (a INT, b INT, ci INT, x, y)")
+    
+    inputs = list(product([0, 1], repeat=3))
+    clampings = [core.Clamping([core.Literal('a', 1 if a else -1), core.Literal('b', 1 if b else -1)] + ([core.Literal('c', -1)] if c else [])) 
+                 for a, b, c in inputs]
+    predictions = Simulator(network, SETUP.readouts).predictions(clampings).T.tolist()
+    for values, observed in zip(inputs, predictions):
+        cur.execute("INSERT INTO dataset VALUES (?,?,?,?,?)", list(values) + map(float, observed))
+    
+    cur.execute("SELECT * FROM dataset")
+    return cur.fetchall()
+
+def insert_benchmark(db, idmodel, network=GOLD):
+    """
+    Inserts noisy predictions of the network for all clampings of SETUP as the dataset of the benchmark
+    """
+    rng = random.Random(idmodel)
+    data = [[row['a'], row['b'], row['ci']] + [abs(row[r] - 0.2 * rng.random()) for r in SETUP.readouts] + [idmodel] for row in gold_rows(network)]
+    
+    con = db.connect()
+    with con:
+        db.insert_rows(con.cursor(), 'dataset', data)
+
+class Interrupted(Exception):
+    pass
+
+def groups(networks, behaviors):
+    return sorted(sorted(group) for group in ResultCache.dump_behaviors(dumps(networks), behaviors))
+
+class WorkflowTestCase(unittest.TestCase):
+    
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.path = tempfile.mkdtemp(prefix='sbloopy-test-')
+        # the workflow writes its log in the working directory
+        os.chdir(self.path)
+        
+        self.graph = graph(self.path)
+        self.db = self.create_db('insilico')
+    
+    def create_db(self, name):
+        db = iDB(name, SETUP)
+        db.create_db()
+        db.load_pkn(self.graph, 2)
+        insert_benchmark(db, 0)
+        return db
+    
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.path)
+    
+    def workflow(self, land=2, db=None, **kwargs):
+        options = {'cache': 0, 'results': 0}
+        options.update(kwargs)
+        return Workflow(db or self.db, self.graph, land, {'max_experiments': 2}, **options)
+    
+    def test_search_tolerance(self):
+        data = Dataset.from_db_rows(gold_rows(GOLD), SETUP)
+        
+        found = {}
+        for tolerance in ['iterative', 'single']:
+            workflow = self.workflow(tolerance=tolerance)
+            learner = workflow.session.learner(data)
+            networks, behaviors = workflow.tolerate(learner, data, data, 0, 0)
+            self.assertEqual(len(behaviors), 1)
+            
+            search = workflow.search_tolerance if tolerance == 'single' else workflow.iterate_tolerance
+            fit, size, networks, behaviors = search(learner, data, data, networks, behaviors)
+            found[tolerance] = (fit, size, dumps(networks), groups(networks, behaviors))
+        
+        self.assertEqual(found['single'], found['iterative'])
+    
+    def test_result_inputs(self):
+        self.assertEqual(self.workflow().results, None)
+        
+        inputs = self.workflow(results=1).inputs
+        self.assertEqual(inputs, self.workflow(results=1).inputs)
+        self.assertNotEqual(inputs, self.workflow(3, results=1).inputs)
+    
+    def test_resume(self):
+        self.workflow(seed=1).run_benchmark(0)
+        
+        resumed = self.create_db('resumed')
+        workflow = self.workflow(db=resumed, seed=1)
+        tolerate = workflow.tolerate
+        def interrupted(*args):
+            # the benchmark is killed after learning and analyzing in the second iteration
+            result = tolerate(*args)
+            if workflow.it == 1:
+                raise Interrupted()
+            
+            return result
+        
+        workflow.tolerate = interrupted
+        self.assertRaises(Interrupted, workflow.run_benchmark, 0)
+        self.assertEqual(resumed.get_last_it(0), 1)
+        
+        self.workflow(db=resumed, seed=1).run_benchmark(0, True)
+        self.assertTrue(resumed.is_done(0))
+        
+        for query in ["SELECT key, it FROM benchmark_data ORDER BY rowid", "SELECT it, training, testing FROM benchmark_mse ORDER BY it"]:
+            self.assertEqual(map(tuple, resumed.connect().execute(query).fetchall()), map(tuple, self.db.connect().execute(query).fetchall()))
+
+if __name__ == '__main__':
+    unittest.main()